@@ -1,71 +1,187 @@
 import streamlit as st
 import paho.mqtt.client as mqtt
-import pandas as pd
-from datetime import datetime
+import pyarrow as pa
+from collections import deque
+import itertools
+import logging
+import logging.handlers
+import os
+import queue
+import threading
 import time
 
+# Buffer sizes: older messages/log lines are evicted once the cap is reached
+MSG_CAP = int(os.environ.get("MQTT_INBOX_CAP", 5000))
+LOG_CAP = 200  # In-memory tail only, the full log is written to LOG_FILE
+LOG_FILE = os.path.join("logs", "app.log")
+VISIBLE_N = 500  # Rows rendered in the received messages table
+LOG_TAIL = 200  # Log lines rendered in the logs window
+MAX_PAYLOAD_BYTES = 1024 * 1024  # Larger payloads are rejected in on_message
+LOG_PAYLOAD_BYTES = 256  # Payload prefix included in "Message received" log lines
+REFRESH_SECONDS = 2  # Refresh interval of the messages/logs view while connected
+
+# Optional per-topic token bucket applied in on_message: messages beyond the rate are
+# dropped. Off unless MQTT_TOPIC_RATE is set or a subscription filter has an override.
+TOPIC_RATE_PER_SEC = float(os.environ["MQTT_TOPIC_RATE"]) if "MQTT_TOPIC_RATE" in os.environ else None
+TOPIC_BURST = float(os.environ.get("MQTT_TOPIC_BURST", 100))
+TOPIC_RATE_LIMITS = {}  # Overrides per subscription filter: {"sensors/#": (rate_per_sec, burst)}
+
 # Initialize session state variables
 if 'mqtt_client' not in st.session_state:
     st.session_state['mqtt_client'] = None
 
-if 'connected' not in st.session_state:
-    st.session_state['connected'] = False
+# State shared with paho's network thread. Callbacks run on that thread and must not
+# touch st.session_state, so they receive this dict as userdata instead.
+if 'mqtt_state' not in st.session_state:
+    st.session_state['mqtt_state'] = {
+        'lock': threading.Lock(),
+        'connected': False,
+        'logs': deque(maxlen=LOG_CAP),
+        'messages': deque(maxlen=MSG_CAP),
+        'message_serial': 0,
+        'dropped_count': 0,  # Messages evicted from a full inbox
+        'throttled_count': 0,  # Messages dropped by the per-topic rate limit
+        'rate_limits': {},  # Subscription filter -> (rate_per_sec, burst)
+        'topic_limits': {},  # Received topic -> its (rate_per_sec, burst), or None if unthrottled
+        'buckets': {},  # topic -> (tokens, last refill time)
+        'subscribed_topics': [],
+    }
+
+# Arrow batches of already-converted rows, so each rerun only converts new messages
+if '_arrow_batches' not in st.session_state:
+    st.session_state['_arrow_batches'] = []
+
+if 'last_rendered_serial' not in st.session_state:
+    st.session_state['last_rendered_serial'] = 0
 
-if 'logs' not in st.session_state:
-    st.session_state['logs'] = []
+state = st.session_state['mqtt_state']
 
-if 'messages' not in st.session_state:
-    st.session_state['messages'] = []
+# Process-wide file logger. Records go through a QueueHandler, so callers never block
+# on disk I/O; a QueueListener thread writes them to a rotating file.
+@st.cache_resource
+def get_file_logger():
+    os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
+    file_handler = logging.handlers.RotatingFileHandler(LOG_FILE, maxBytes=10_485_760, backupCount=5)
+    file_handler.setFormatter(logging.Formatter("[%(asctime)s] %(message)s", "%Y-%m-%d %H:%M:%S"))
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, file_handler)
+    listener.start()
+    logger = logging.getLogger("mqtt_client")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    return logger
 
-if 'subscribed_topics' not in st.session_state:
-    st.session_state['subscribed_topics'] = []
+logger = get_file_logger()
+
+# Timestamp helper: integer formatting instead of strftime, done at most once per second
+_ts_cache = (None, "")
+def _ts():
+    global _ts_cache
+    sec = int(time.time())
+    if sec != _ts_cache[0]:
+        lt = time.localtime(sec)
+        _ts_cache = (sec, f"{lt.tm_year:04d}-{lt.tm_mon:02d}-{lt.tm_mday:02d} "
+                          f"{lt.tm_hour:02d}:{lt.tm_min:02d}:{lt.tm_sec:02d}")
+    return _ts_cache[1]
 
 # Append log helper
-def append_log(msg):
-    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    st.session_state['logs'].append(f"[{timestamp}] {msg}")
+def append_log(state, msg):
+    logger.info(msg)
+    timestamp = _ts()
+    with state['lock']:
+        state['logs'].append(f"[{timestamp}] {msg}")
 
-# MQTT Callbacks
+# MQTT Callbacks (called from the network thread started by loop_start)
 def on_connect(client, userdata, flags, rc):
     if rc == 0:
-        st.session_state['connected'] = True
-        append_log("Connected to MQTT Broker successfully.")
+        userdata['connected'] = True
+        append_log(userdata, "Connected to MQTT Broker successfully.")
         # Subscribe to topics after connection
-        for topic in st.session_state['subscribed_topics']:
+        for topic in userdata['subscribed_topics']:
             client.subscribe(topic)
-            append_log(f"Subscribed to topic: {topic}")
+            append_log(userdata, f"Subscribed to topic: {topic}")
     else:
-        append_log(f"Failed to connect, return code {rc}")
+        append_log(userdata, f"Failed to connect, return code {rc}")
 
 def on_disconnect(client, userdata, rc):
-    st.session_state['connected'] = False
-    append_log("Disconnected from MQTT Broker.")
+    userdata['connected'] = False
+    append_log(userdata, "Disconnected from MQTT Broker.")
+
+def topic_rate_limit(userdata, topic):
+    """Rate limit of a received topic: the override of the first subscription filter
+    matching it, else the default. None when the topic is not throttled."""
+    limits = userdata['topic_limits']
+    if topic not in limits:
+        default = (TOPIC_RATE_PER_SEC, TOPIC_BURST) if TOPIC_RATE_PER_SEC is not None else None
+        limits[topic] = next((limit for sub, limit in userdata['rate_limits'].items()
+                              if mqtt.topic_matches_sub(sub, topic)), default)
+    return limits[topic]
 
 def on_message(client, userdata, msg):
-    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    payload = msg.payload.decode()
-    st.session_state['messages'].append({
-        "Serial": len(st.session_state['messages']) + 1,
-        "Timestamp": timestamp,
-        "Topic": msg.topic,
-        "Payload": payload
-    })
-    append_log(f"Message received on topic '{msg.topic}': {payload}")
+    # Token bucket per topic, checked before any other work on the message
+    limit = topic_rate_limit(userdata, msg.topic)
+    if limit is not None:
+        rate, burst = limit
+        now = time.monotonic()
+        tokens, last = userdata['buckets'].get(msg.topic, (burst, now))
+        tokens = min(burst, tokens + (now - last) * rate)
+        if tokens < 1:
+            userdata['buckets'][msg.topic] = (tokens, now)
+            userdata['throttled_count'] += 1
+            return
+        userdata['buckets'][msg.topic] = (tokens - 1, now)
+    # Reject oversize payloads before paying for decoding and buffering them
+    if len(msg.payload) > MAX_PAYLOAD_BYTES:
+        append_log(userdata, f"Dropped {len(msg.payload)} byte message on topic '{msg.topic}' (limit {MAX_PAYLOAD_BYTES} bytes)")
+        return
+    timestamp = _ts()
+    # Payloads are buffered as raw bytes and only decoded for the rows that get rendered
+    payload = msg.payload
+    with userdata['lock']:
+        if len(userdata['messages']) == userdata['messages'].maxlen:
+            # Inbox full: the append below evicts the oldest message
+            userdata['dropped_count'] += 1
+        # Monotonic counter, stays correct after old messages are evicted
+        userdata['message_serial'] += 1
+        userdata['messages'].append({
+            "Serial": userdata['message_serial'],
+            "Timestamp": timestamp,
+            "Topic": msg.topic,
+            "Payload": payload
+        })
+    preview = payload[:LOG_PAYLOAD_BYTES].decode('utf-8', errors='replace')
+    if len(payload) > LOG_PAYLOAD_BYTES:
+        preview += "..."
+    append_log(userdata, f"Message received on topic '{msg.topic}': {preview}")
 
 # MQTT client setup function
 def setup_mqtt_client(broker, port, username, password, topics):
-    client = mqtt.Client()
+    client = mqtt.Client(userdata=state)
     if username:
         client.username_pw_set(username, password)
     client.on_connect = on_connect
     client.on_message = on_message
     client.on_disconnect = on_disconnect
+    state['subscribed_topics'] = topics
+    state['rate_limits'] = {t: TOPIC_RATE_LIMITS[t] for t in topics if t in TOPIC_RATE_LIMITS}
+    state['topic_limits'] = {}
+    state['buckets'] = {}
     client.connect(broker, port, keepalive=60)
-    st.session_state['subscribed_topics'] = topics
+    client.loop_start()  # Network I/O and callbacks run on paho's own thread
     return client
 
+# Stop the network thread of the current client, if any
+def teardown_mqtt_client():
+    client = st.session_state['mqtt_client']
+    if client is not None:
+        client.disconnect()
+        client.loop_stop()
+        st.session_state['mqtt_client'] = None
+        state['connected'] = False
+
 # Streamlit UI
-st.title("Streamlit MQTT Client with Logs (No Threading)")
+st.title("Streamlit MQTT Client with Logs")
 
 # MQTT Configuration Inputs
 broker = st.text_input("Broker address", "localhost")
@@ -80,20 +196,24 @@ topics = [t.strip() for t in topics_input.split(",") if t.strip()]
 connect_button = st.button("Connect to MQTT Broker")
 
 if connect_button:
+    teardown_mqtt_client()
     try:
         client = setup_mqtt_client(broker, port, username, password, topics)
         st.session_state['mqtt_client'] = client
-        append_log("Attempting to connect to broker...")
-        client.loop(timeout=1.0)  # Process network events once
+        append_log(state, "Attempting to connect to broker...")
+        time.sleep(1)  # Give the network thread time to receive CONNACK
         st.rerun()
     except Exception as e:
-        append_log(f"Error connecting to broker: {e}")
+        append_log(state, f"Error connecting to broker: {e}")
 
-# If connected, show message sending UI and periodically process MQTT events
-if st.session_state['connected'] and st.session_state['mqtt_client']:
+# If connected, show message sending UI
+if state['connected'] and st.session_state['mqtt_client']:
     client = st.session_state['mqtt_client']
 
     st.success(f"Connected to {broker}:{port}")
+    if st.button("Disconnect"):
+        teardown_mqtt_client()
+        st.rerun()
 
     # Message sending
     st.header("Publish MQTT Message")
@@ -103,32 +223,63 @@ if st.session_state['connected'] and st.session_state['mqtt_client']:
         if send_topic and send_message:
             result = client.publish(send_topic, send_message)
             if result.rc == mqtt.MQTT_ERR_SUCCESS:
-                append_log(f"Published message to topic '{send_topic}': {send_message}")
+                append_log(state, f"Published message to topic '{send_topic}': {send_message}")
             else:
-                append_log(f"Failed to publish message to topic '{send_topic}'")
+                append_log(state, f"Failed to publish message to topic '{send_topic}'")
         else:
-            append_log("Publish topic or message is empty.")
-
-    # Process MQTT network events to receive messages
-    client.loop(timeout=1.0) 
-
-    # Display received messages
-    st.header("Received Messages")
-    if st.session_state['messages']:
-        df_msgs = pd.DataFrame(st.session_state['messages'])
-        st.table(df_msgs)
-    else:
-        st.write("No messages received yet.")
+            append_log(state, "Publish topic or message is empty.")
 
 else:
     st.info("Not connected to MQTT Broker.")
 
-# Show logs window
-st.header("MQTT Logs")
-log_text = "\n".join(st.session_state['logs'])
-st.text_area("Logs", value=log_text, height=200, max_chars=None, key="log_area")
+# Messages and logs rerun on their own every REFRESH_SECONDS while connected,
+# without re-executing the rest of the page
+@st.fragment(run_every=REFRESH_SECONDS if state['connected'] else None)
+def live_view():
+    if state['connected']:
+        # Display received messages
+        st.header("Received Messages")
+        with state['lock']:
+            messages = state['messages']
+            new_count = min(state['message_serial'] - st.session_state['last_rendered_serial'], len(messages))
+            new_rows = list(itertools.islice(messages, len(messages) - new_count, None)) if new_count > 0 else []
+            st.session_state['last_rendered_serial'] = state['message_serial']
+            dropped_count = state['dropped_count']
+            throttled_count = state['throttled_count']
+        if dropped_count:
+            st.warning(f"⚠️ {dropped_count} messages dropped (backpressure)")
+        if throttled_count:
+            st.warning(f"⚠️ {throttled_count} messages dropped by the per-topic rate limit")
+        if new_rows:
+            # Rows past the newest VISIBLE_N would be sliced off below, skip decoding them
+            new_rows = new_rows[-VISIBLE_N:]
+            st.session_state['_arrow_batches'].append(pa.RecordBatch.from_pydict({
+                "Serial": [row["Serial"] for row in new_rows],
+                "Timestamp": [row["Timestamp"] for row in new_rows],
+                "Topic": [row["Topic"] for row in new_rows],
+                "Payload": [row["Payload"].decode('utf-8', errors='replace') for row in new_rows],
+            }))
+        if st.session_state['_arrow_batches']:
+            table = pa.Table.from_batches(st.session_state['_arrow_batches'])
+            if table.num_rows > VISIBLE_N:
+                # Keep only the newest VISIBLE_N rows and compact them back into batches
+                table = table.slice(table.num_rows - VISIBLE_N)
+                st.session_state['_arrow_batches'] = table.to_batches()
+            st.dataframe(table, use_container_width=True, height=400)
+        else:
+            st.write("No messages received yet.")
 
-# Auto-refresh button to keep MQTT loop running and update UI
-if st.session_state['connected']:
-    if st.button("Refresh to process MQTT events"):
-        st.rerun()
+    # Show logs window
+    st.header("MQTT Logs")
+    with state['lock']:
+        logs = state['logs']
+        log_text = "\n".join(itertools.islice(logs, max(0, len(logs) - LOG_TAIL), None))
+    # st.code has no widget state to diff, unlike a text_area
+    st.code(log_text, language=None)
+
+live_view()
+
+# The full log lives on disk; it is only read when a download is requested
+if st.checkbox("Prepare full log for download") and os.path.exists(LOG_FILE):
+    with open(LOG_FILE, "rb") as f:
+        st.download_button("Download full log", data=f.read(), file_name="mqtt_client.log", mime="text/plain")
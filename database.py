@@ -1,99 +1,433 @@
 import sqlite3
 import json
+from contextlib import contextmanager
 import pandas as pd
 from datetime import datetime
 import os
+import queue
+import threading
+import time
+import zlib
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+if orjson is not None:
+    def _json_dumps(obj):
+        return orjson.dumps(obj).decode()
+    _json_loads = orjson.loads
+else:
+    def _json_dumps(obj):
+        return json.dumps(obj, separators=(',', ':'))
+    _json_loads = json.loads
+
+def _serialize_message(msg):
+    """Serialized JSON for a message record, reusing the original payload when present"""
+    raw_json = msg.get('RawJSON')
+    if isinstance(raw_json, (str, bytes)):
+        return raw_json
+    return _json_dumps(msg.get('JSON Data', {}))
+
+def _timestamp_text(timestamp):
+    """Timestamps are stored as 'YYYY-MM-DD HH:MM:SS' text, whether given as text or datetimes"""
+    if isinstance(timestamp, datetime):
+        return timestamp.strftime('%Y-%m-%d %H:%M:%S')
+    return timestamp
+
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+# Raised for corrupt frames, or zstd frames that need a dictionary other than ours
+DECOMPRESS_ERRORS = (zlib.error,) if zstandard is None else (zlib.error, zstandard.ZstdError)
+DICT_SAMPLE_COUNT = 1000  # Payloads collected before training a zstd dictionary
+DICT_SIZE = 16384
 
 class JSONMessageDB:
     """SQLite database handler for JSON messages"""
     
-    def __init__(self, db_path="json_messages.db"):
+    # Statements are kept as constants so each call sends identical SQL text and
+    # hits the connection's prepared-statement cache instead of re-parsing
+    # Messages already stored (same serial number, topic and timestamp) are skipped, so saving
+    # the same rows again, e.g. the whole table via "Save to DB", adds no duplicates. The payload
+    # is not compared: rows loaded back from the database are re-serialized on save, and
+    # compressed payloads change once the zstd dictionary is trained.
+    # IS compares NULLs as equal, like the GROUP BY in remove_duplicate_messages.
+    _INSERT_SQL = '''
+        INSERT INTO json_messages (serial_no, timestamp, topic_id, json_data)
+        SELECT ?1, ?2, ?3, ?4
+        WHERE NOT EXISTS (
+            SELECT 1 FROM json_messages
+            WHERE serial_no IS ?1 AND topic_id IS ?3 AND timestamp IS ?2
+        )
+    '''
+    _REGISTER_TOPIC_SQL = 'INSERT OR IGNORE INTO topics (name) VALUES (?)'
+    _TOPIC_ID_SQL = 'SELECT id FROM topics WHERE name = ?'
+    _SELECT_PAGE_SQL = '''
+        SELECT m.serial_no, m.timestamp, t.name, m.json_data, m.created_at, m.id
+        FROM json_messages m
+        LEFT JOIN topics t ON t.id = m.topic_id
+        {clause}
+    '''
+    # The DataFrame readers also select the keyset columns (_key_created_at, _key_id)
+    # to build the next page's cursor; they are dropped before the frame is returned
+    _SELECT_DF_SQL = '''
+        SELECT m.serial_no AS "Serial No.", m.timestamp AS "Timestamp", t.name AS "Topic",
+               m.json_data AS "JSON Data", m.created_at AS "Created At",
+               m.created_at AS _key_created_at, m.id AS _key_id
+        FROM json_messages m
+        LEFT JOIN topics t ON t.id = m.topic_id
+        {clause}
+    '''
+    # Message metadata only: payload BLOBs are not read from disk
+    _SELECT_META_DF_SQL = '''
+        SELECT m.serial_no AS "Serial No.", m.timestamp AS "Timestamp", t.name AS "Topic",
+               m.created_at AS _key_created_at, m.id AS _key_id
+        FROM json_messages m
+        LEFT JOIN topics t ON t.id = m.topic_id
+        {clause}
+    '''
+    _COUNT_SQL = 'SELECT COUNT(*) FROM json_messages'
+    _TOPICS_SQL = '''
+        SELECT name FROM topics t
+        WHERE EXISTS (SELECT 1 FROM json_messages m WHERE m.topic_id = t.id)
+        ORDER BY name
+    '''
+    
+    def __init__(self, db_path="json_messages.db", max_in_flight=10_000, flush_interval_ms=100, max_batch_size=500,
+                 compress=False):
         self.db_path = db_path
+        # Optional payload compression: zstd with a dictionary trained on early
+        # payloads, or zlib when the zstandard package is not installed
+        self.compress = compress
+        self.dict_path = f"{db_path}.zdict"
+        self._dict_lock = threading.Lock()
+        self._zdict = self._load_zstd_dict()
+        self._dict_samples = [] if self._zdict is None else None
+        # A single connection is shared by all methods (and threads) of this instance
+        self._lock = threading.Lock()
+        self._conn = self._connect()
+        # Bounded ingest queue drained in batches by a background writer thread
+        self.max_in_flight = max_in_flight
+        self.flush_interval_ms = flush_interval_ms
+        self.max_batch_size = max_batch_size
+        # Holds DataFrame batches; at most max_in_flight rows are pending in total
+        self._ingest_q = queue.Queue()
+        self._pending_rows = 0
+        self._writer_thread = None
+        # Serializes producers (starting the writer, evicting then putting when full)
+        # and guards _pending_rows
+        self._enqueue_lock = threading.Lock()
+        # Running totals of messages the writer lost, for callers to report
+        self.dropped_count = 0  # Evicted from a full queue
+        self.failed_count = 0  # In batches that failed to write
+        self.last_write_error = None
+        # Set by delete_database: the writer exits and pending writes are skipped
+        self._shutdown = threading.Event()
+        # Bumped on every write so callers can cache read results per version
+        self.data_version = 0
+        self._count_cache = (None, 0)  # (data_version, message count) of the last COUNT(*)
+        self._topic_ids = {}  # Topic name -> topics.id, filled as topics are written
         self.init_database()
     
+    def _connect(self):
+        """Open the cached connection and apply performance pragmas"""
+        # isolation_level=None: autocommit, batch writes open their own transaction
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None,
+                               cached_statements=256)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        conn.execute('PRAGMA mmap_size=268435456')
+        conn.execute('PRAGMA cache_size=-65536')  # 64 MB page cache
+        return conn
+    
     def init_database(self):
         """Initialize the database and create tables if they don't exist"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS json_messages (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                serial_no INTEGER,
-                timestamp TEXT,
-                topic TEXT,
-                json_data TEXT,
-                created_at TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Create index for better query performance
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_timestamp ON json_messages(timestamp)
-        ''')
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_topic ON json_messages(topic)
-        ''')
-        
-        conn.commit()
-        conn.close()
+        with self.connection():
+            cursor = self._conn.cursor()
+            
+            # Topic names are stored once; messages reference them by integer id
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS topics (
+                    id INTEGER PRIMARY KEY,
+                    name TEXT UNIQUE
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS json_messages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    serial_no INTEGER,
+                    timestamp TEXT,
+                    topic_id INTEGER REFERENCES topics(id),
+                    json_data BLOB,
+                    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            self._migrate_topic_column(cursor)
+            
+            # Create index for better query performance
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_timestamp ON json_messages(timestamp)
+            ''')
+            # Covering indexes for newest-first keyset pagination; SQLite walks
+            # them backwards for ORDER BY created_at DESC, id DESC
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_created ON json_messages(created_at, id)
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_topic_id_created ON json_messages(topic_id, created_at, id)
+            ''')
+            # Superseded by idx_topic_id_created
+            cursor.execute('DROP INDEX IF EXISTS idx_topic')
+            cursor.execute('DROP INDEX IF EXISTS idx_topic_created')
+            # Lookup index for the duplicate check in _INSERT_SQL. Not unique: duplicates
+            # stored by earlier versions are only removed on request.
+            cursor.execute('DROP INDEX IF EXISTS ux_message')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_message_key ON json_messages(serial_no, topic_id, timestamp)
+            ''')
+    
+    def _migrate_topic_column(self, cursor):
+        """Move databases that store topic names per message over to the topics table"""
+        columns = {row[1] for row in cursor.execute('PRAGMA table_info(json_messages)')}
+        if 'topic_id' in columns:
+            return
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            cursor.execute('ALTER TABLE json_messages ADD COLUMN topic_id INTEGER REFERENCES topics(id)')
+            cursor.execute('''
+                INSERT OR IGNORE INTO topics (name)
+                SELECT DISTINCT topic FROM json_messages WHERE topic IS NOT NULL
+            ''')
+            cursor.execute('''
+                UPDATE json_messages
+                SET topic_id = (SELECT id FROM topics WHERE name = json_messages.topic)
+            ''')
+        except Exception:
+            cursor.execute('ROLLBACK')
+            raise
+        cursor.execute('COMMIT')
+    
+    def _resolve_topic_ids(self, names):
+        """Return topic ids for the given names, registering unknown topics (lock held)"""
+        for name in set(names) - self._topic_ids.keys():
+            self._conn.execute(self._REGISTER_TOPIC_SQL, (name,))
+            self._topic_ids[name] = self._conn.execute(self._TOPIC_ID_SQL, (name,)).fetchone()[0]
+        return self._topic_ids
+    
+    @contextmanager
+    def connection(self):
+        """
+        Hold the connection lock and yield the connection. Raises sqlite3.ProgrammingError
+        once the database has been closed or deleted, instead of silently doing nothing.
+        """
+        with self._lock:
+            if self._conn is None or self._shutdown.is_set():
+                raise sqlite3.ProgrammingError(f"Database {self.db_path} has been closed")
+            yield self._conn
+    
+    def close(self):
+        """Close the cached database connection"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+    
+    def _load_zstd_dict(self):
+        """Load a previously trained compression dictionary, if any"""
+        if zstandard is not None and os.path.exists(self.dict_path):
+            with open(self.dict_path, 'rb') as f:
+                return zstandard.ZstdCompressionDict(f.read())
+        return None
+    
+    def _train_zstd_dict(self, raw_payloads):
+        """Collect payload samples and train the zstd dictionary once enough are seen"""
+        with self._dict_lock:
+            if self._dict_samples is None:
+                return
+            self._dict_samples.extend(raw_payloads[:DICT_SAMPLE_COUNT - len(self._dict_samples)])
+            if len(self._dict_samples) < DICT_SAMPLE_COUNT:
+                return
+            try:
+                zdict = zstandard.train_dictionary(DICT_SIZE, self._dict_samples)
+                with open(self.dict_path, 'wb') as f:
+                    f.write(zdict.as_bytes())
+                self._zdict = zdict
+            except Exception as e:
+                print(f"Error training compression dictionary: {e}")
+            self._dict_samples = None
+    
+    def _encode_payloads(self, payloads):
+        """Prepare serialized JSON (str or raw UTF-8 bytes) for storage, compressing it if enabled"""
+        if not self.compress:
+            # Raw bytes are bound as BLOBs without a decode/encode round trip
+            return payloads
+        raw_payloads = [p if isinstance(p, bytes) else p.encode('utf-8') for p in payloads]
+        if zstandard is None:
+            return [zlib.compress(raw, 3) for raw in raw_payloads]
+        if self._dict_samples is not None:
+            self._train_zstd_dict(raw_payloads)
+        cctx = zstandard.ZstdCompressor(level=3, dict_data=self._zdict)
+        return [cctx.compress(raw) for raw in raw_payloads]
+    
+    def _decode_payload(self, value):
+        """Parse a stored json_data value, decompressing it first if needed"""
+        if isinstance(value, bytes):
+            try:
+                if value[:4] == ZSTD_MAGIC:
+                    if zstandard is None:
+                        raise ValueError("zstandard is required to read compressed messages")
+                    # Frames written before the dictionary was trained carry dict_id 0
+                    has_dict = zstandard.get_frame_parameters(value).dict_id != 0
+                    dctx = zstandard.ZstdDecompressor(dict_data=self._zdict if has_dict else None)
+                    value = dctx.decompress(value)
+                elif value[:1] == b'x':  # zlib header, JSON text never starts with 'x'
+                    value = zlib.decompress(value)
+            except DECOMPRESS_ERRORS:
+                pass # Parsed as stored; if that fails too, decode_payloads substitutes {}
+        return _json_loads(value)
     
     def insert_message(self, serial_no, timestamp, topic, json_data):
         """Insert a single JSON message into the database"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO json_messages (serial_no, timestamp, topic, json_data)
-            VALUES (?, ?, ?, ?)
-        ''', (serial_no, timestamp, topic, json.dumps(json_data)))
-        
-        conn.commit()
-        conn.close()
+        payload = self._encode_payloads([_json_dumps(json_data)])[0]
+        with self.connection():
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                topic_id = self._resolve_topic_ids([topic])[topic]
+                self._conn.execute(self._INSERT_SQL, (serial_no, _timestamp_text(timestamp), topic_id, payload))
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                self._topic_ids.clear()
+                raise
+            self._conn.execute('COMMIT')
+            self.data_version += 1
     
     def insert_messages_batch(self, messages):
         """Insert multiple JSON messages in batch"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        data_to_insert = []
-        for msg in messages:
-            data_to_insert.append((
-                msg.get('Serial No.', 0),
-                msg.get('Timestamp', ''),
-                msg.get('Topic', ''),
-                json.dumps(msg.get('JSON Data', {}))
-            ))
-        
-        cursor.executemany('''
-            INSERT INTO json_messages (serial_no, timestamp, topic, json_data)
-            VALUES (?, ?, ?, ?)
-        ''', data_to_insert)
-        
-        conn.commit()
-        conn.close()
+        self.insert_messages_columnar(
+            [msg.get('Serial No.', 0) for msg in messages],
+            [_timestamp_text(msg.get('Timestamp', '')) for msg in messages],
+            [msg.get('Topic', '') for msg in messages],
+            [_serialize_message(msg) for msg in messages]
+        )
     
-    def get_all_messages(self):
-        """Retrieve all JSON messages from the database"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT serial_no, timestamp, topic, json_data, created_at
-            FROM json_messages
-            ORDER BY created_at DESC
-        ''')
-        
-        rows = cursor.fetchall()
-        conn.close()
+    def insert_messages_df(self, df):
+        """Insert the rows of a JSON messages table, reading whole columns instead of per-row dicts"""
+        if df.empty:
+            return
+        timestamps = df.get('Timestamp', pd.Series('', index=df.index))
+        if pd.api.types.is_datetime64_any_dtype(timestamps):
+            timestamps = timestamps.dt.strftime('%Y-%m-%d %H:%M:%S')
+        else:
+            timestamps = timestamps.map(_timestamp_text)
+        raw_json = df.get('RawJSON', pd.Series(None, index=df.index, dtype=object))
+        json_data = df.get('JSON Data', pd.Series([{}] * len(df), index=df.index))
+        self.insert_messages_columnar(
+            df.get('Serial No.', pd.Series(0, index=df.index)).tolist(),
+            timestamps.tolist(),
+            df.get('Topic', pd.Series('', index=df.index)).tolist(),
+            [raw if isinstance(raw, (str, bytes)) else _json_dumps(data) for raw, data in zip(raw_json, json_data)]
+        )
+    
+    def insert_messages_columnar(self, serials, timestamps, topics, payloads):
+        """
+        Insert messages given as parallel column sequences, skipping per-message
+        dict lookups. payloads are serialized JSON, as str or UTF-8 bytes.
+        """
+        payloads = self._encode_payloads(payloads)
         
-        messages = []
-        for row in rows:
+        with self.connection():
+            # One explicit transaction so the whole batch costs a single commit
+            self._conn.execute('BEGIN IMMEDIATE')
             try:
-                json_data = json.loads(row[3])
-            except json.JSONDecodeError:
-                json_data = {}
-            
+                topic_ids = self._resolve_topic_ids(topics)
+                self._conn.executemany(
+                    self._INSERT_SQL,
+                    zip(serials, timestamps, map(topic_ids.__getitem__, topics), payloads)
+                )
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                # Ids registered inside the rolled back transaction are gone
+                self._topic_ids.clear()
+                raise
+            self._conn.execute('COMMIT')
+            self.data_version += 1
+    
+    def enqueue_messages_df(self, df):
+        """
+        Queue a JSON messages table for the background batch writer, which stores it
+        with insert_messages_df. The oldest pending rows are dropped when the queue is full.
+        """
+        if df.empty:
+            return
+        with self._enqueue_lock:
+            if self._shutdown.is_set():
+                # The writer has exited; queued messages would never be written
+                raise sqlite3.ProgrammingError(f"Database {self.db_path} has been closed")
+            if self._writer_thread is None:
+                self._start_writer()
+            if len(df) > self.max_in_flight:
+                self.dropped_count += len(df) - self.max_in_flight
+                df = df.iloc[-self.max_in_flight:]
+            # Backpressure: discard the oldest pending batches to make room
+            while self._pending_rows + len(df) > self.max_in_flight:
+                try:
+                    evicted = self._ingest_q.get_nowait()
+                except queue.Empty:
+                    break
+                self._pending_rows -= len(evicted)
+                self.dropped_count += len(evicted)
+            self._ingest_q.put_nowait(df)
+            self._pending_rows += len(df)
+    
+    def _start_writer(self):
+        """Start the background thread that flushes queued messages"""
+        self._writer_thread = threading.Thread(target=self._ingest_loop, name="json-db-writer")
+        self._writer_thread.daemon = True
+        self._writer_thread.start()
+    
+    def _take_batch(self, timeout):
+        """Take the next queued batch, releasing its rows from the pending count"""
+        batch = self._ingest_q.get(timeout=timeout)
+        with self._enqueue_lock:
+            self._pending_rows -= len(batch)
+        return batch
+    
+    def _ingest_loop(self):
+        """Drain the ingest queue, writing about max_batch_size messages per transaction"""
+        interval = self.flush_interval_ms / 1000
+        while not self._shutdown.is_set():
+            try:
+                batches = [self._take_batch(interval)]
+            except queue.Empty:
+                continue
+            rows = len(batches[0])
+            deadline = time.monotonic() + interval
+            while rows < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batches.append(self._take_batch(min(remaining, 0.01)))
+                    rows += len(batches[-1])
+                except queue.Empty:
+                    continue
+            try:
+                self.insert_messages_df(batches[0] if len(batches) == 1 else pd.concat(batches))
+            except Exception as e:
+                self.failed_count += rows
+                self.last_write_error = str(e)
+                print(f"Error writing batch to database: {e}")
+    
+    def _rows_to_messages(self, rows):
+        """Convert (serial_no, timestamp, topic, json_data, created_at) rows to message dicts"""
+        messages = []
+        for row, json_data in zip(rows, self.decode_payloads(row[3] for row in rows)):
             messages.append({
                 'Serial No.': row[0],
                 'Timestamp': row[1],
@@ -104,74 +438,136 @@ class JSONMessageDB:
         
         return messages
     
-    def get_messages_by_topic(self, topic):
-        """Retrieve messages filtered by topic"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def _page_filter(self, limit, before, topic):
+        """Build the WHERE/ORDER BY/LIMIT clause and params shared by the paged readers"""
+        conditions = []
+        params = []
+        if topic is not None:
+            conditions.append('m.topic_id = (SELECT id FROM topics WHERE name = ?)')
+            params.append(topic)
+        if before is not None:
+            conditions.append('(m.created_at, m.id) < (?, ?)')
+            params.extend(before)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        # LIMIT -1 means no limit in SQLite
+        params.append(-1 if limit is None else limit)
+        return f"{where} ORDER BY m.created_at DESC, m.id DESC LIMIT ?", params
+    
+    def get_messages_page(self, limit=100, before=None, topic=None):
+        """
+        Retrieve one page of messages, newest first, using keyset pagination.
+        Returns (messages, cursor); pass cursor as `before` to fetch the next
+        (older) page. cursor is None once there are no more rows.
+        """
+        clause, params = self._page_filter(limit, before, topic)
         
-        cursor.execute('''
-            SELECT serial_no, timestamp, topic, json_data, created_at
-            FROM json_messages
-            WHERE topic = ?
-            ORDER BY created_at DESC
-        ''', (topic,))
+        with self.connection():
+            rows = self._conn.execute(self._SELECT_PAGE_SQL.format(clause=clause), params).fetchall()
         
-        rows = cursor.fetchall()
-        conn.close()
+        next_cursor = None
+        if rows and limit is not None and len(rows) == limit:
+            next_cursor = (rows[-1][4], rows[-1][5])
+        return self._rows_to_messages(rows), next_cursor
+    
+    def get_messages_df(self, limit=100, before=None, topic=None, decode_json=True, payloads=True):
+        """
+        Retrieve messages straight into a DataFrame, newest first.
+        With decode_json=False the 'JSON Data' column holds the stored values
+        undecoded, for callers that decode only the rows they display via
+        decode_payloads(). With payloads=False only the 'Serial No.', 'Timestamp'
+        and 'Topic' columns are read, for callers such as the CSV export.
+        """
+        return self.get_messages_df_page(limit, before, topic, decode_json, payloads)[0]
+    
+    def get_messages_df_page(self, limit=100, before=None, topic=None, decode_json=True, payloads=True):
+        """
+        Retrieve one page of messages as a DataFrame (see get_messages_df).
+        Returns (df, cursor) like get_messages_page.
+        """
+        clause, params = self._page_filter(limit, before, topic)
+        sql = self._SELECT_DF_SQL if payloads else self._SELECT_META_DF_SQL
         
-        messages = []
-        for row in rows:
-            try:
-                json_data = json.loads(row[3])
-            except json.JSONDecodeError:
-                json_data = {}
-            
-            messages.append({
-                'Serial No.': row[0],
-                'Timestamp': row[1],
-                'Topic': row[2],
-                'JSON Data': json_data,
-                'Created At': row[4]
-            })
+        with self.connection():
+            df = pd.read_sql_query(sql.format(clause=clause), self._conn, params=params)
         
-        return messages
+        created_at, ids = df.pop('_key_created_at'), df.pop('_key_id')
+        next_cursor = None
+        if limit is not None and len(df) == limit:
+            next_cursor = (created_at.iloc[-1], int(ids.iloc[-1]))
+        if payloads and decode_json:
+            df['JSON Data'] = self.decode_payloads(df['JSON Data'])
+        return df, next_cursor
+    
+    def decode_payloads(self, values):
+        """Decode stored json_data values, using {} for unreadable ones"""
+        decoded = []
+        for value in values:
+            try:
+                decoded.append(self._decode_payload(value))
+            except (ValueError, zlib.error):
+                decoded.append({})
+        return decoded
+    
+    def get_all_messages(self, limit=100, before=None):
+        """Retrieve up to `limit` JSON messages (None for all), newest first"""
+        return self.get_messages_page(limit, before)[0]
+    
+    def get_messages_by_topic(self, topic, limit=100, before=None):
+        """Retrieve up to `limit` messages for a topic (None for all), newest first"""
+        return self.get_messages_page(limit, before, topic=topic)[0]
     
     def clear_all_messages(self):
         """Clear all messages from the database"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('DELETE FROM json_messages')
-        conn.commit()
-        conn.close()
+        with self.connection():
+            # Topic rows are kept so cached topic ids stay valid
+            self._conn.execute('DELETE FROM json_messages')
+            # Give the freed pages back to the filesystem
+            self._conn.execute('VACUUM')
+            self.data_version += 1
+    
+    def remove_duplicate_messages(self):
+        """Delete repeated copies of stored messages, keeping the oldest. Returns the number removed."""
+        with self.connection():
+            removed = self._conn.execute('''
+                DELETE FROM json_messages WHERE id NOT IN (
+                    SELECT MIN(id) FROM json_messages GROUP BY serial_no, topic_id, timestamp
+                )
+            ''').rowcount
+            self.data_version += 1
+        return removed
     
     def get_message_count(self):
         """Get total count of messages in database"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT COUNT(*) FROM json_messages')
-        count = cursor.fetchone()[0]
-        conn.close()
+        with self.connection():
+            # COUNT(*) scans the table, so it only runs again after a write
+            if self._count_cache[0] != self.data_version:
+                self._count_cache = (self.data_version, self._conn.execute(self._COUNT_SQL).fetchone()[0])
+            count = self._count_cache[1]
         
         return count
     
     def get_topics(self):
         """Get list of unique topics in database"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT DISTINCT topic FROM json_messages ORDER BY topic')
-        topics = [row[0] for row in cursor.fetchall()]
-        conn.close()
+        with self.connection():
+            topics = [row[0] for row in self._conn.execute(self._TOPICS_SQL)]
         
         return topics
     
     def delete_database(self):
         """Delete the entire database file"""
         try:
+            # Stop the background writer so nothing writes to the file while it is removed
+            self._shutdown.set()
+            if self._writer_thread is not None:
+                self._writer_thread.join(timeout=5)
+            # The cached connection must be closed before the file can be removed
+            self.close()
             if os.path.exists(self.db_path):
                 os.remove(self.db_path)
+                # WAL mode leaves side files next to the database
+                for suffix in ('-wal', '-shm', '.zdict'):
+                    if os.path.exists(self.db_path + suffix):
+                        os.remove(self.db_path + suffix)
                 return True
         except Exception as e:
             print(f"Error deleting database: {e}")
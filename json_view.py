@@ -0,0 +1,145 @@
+import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import plotly.graph_objects as go
+
+try:
+    from tsdownsample import LTTBDownsampler # Shape-preserving downsampling of long series
+except ImportError:
+    LTTBDownsampler = None
+
+DOWNSAMPLE_POINTS = 4_000 # Points per trace sent to the browser, longer series are downsampled
+TIMESTAMP_CACHE_SIZE = 100_000 # Parsed timestamps kept across reruns for plotting
+
+def append_rows(df, new_rows, max_rows):
+    """
+    Returns df with new_rows appended, keeping only the newest max_rows rows. Rows that
+    would be trimmed are left out before concatenating, so the table is copied once.
+    """
+    if len(new_rows) >= max_rows:
+        return new_rows.iloc[len(new_rows) - max_rows:].reset_index(drop=True)
+    keep = max_rows - len(new_rows)
+    if len(df) > keep:
+        df = df.iloc[len(df) - keep:]
+    return pd.concat([df, new_rows], ignore_index=True)
+
+def session_memo(cache, name, key, compute):
+    """
+    Returns compute(), reusing the value stored under name in `cache` (a dict kept in the
+    session's state) while key is unchanged. Derived data is cached per session, so one
+    session's messages can never be served to another.
+    """
+    entry = cache.get(name)
+    if entry is None or entry[0] != key:
+        entry = (key, compute())
+        cache[name] = entry
+    return entry[1]
+
+def _arrow_or_frame(df):
+    try:
+        return pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Columns mixing value types: st.dataframe converts those itself
+        return df
+
+def arrow_table(df, key, cache):
+    """Arrow table handed to st.dataframe, so reruns without new messages skip the conversion."""
+    return session_memo(cache, "arrow_table", key, lambda: _arrow_or_frame(df))
+
+def csv_bytes(df, key, cache):
+    """CSV export of df, kept in the session's `cache` while key is unchanged."""
+    return session_memo(cache, "csv_bytes", key, lambda: _csv_bytes(df))
+
+# Written by Arrow's C++ writer, instead of building the whole file as a Python string first.
+# Unlike DataFrame.to_csv it quotes the header and all strings, writes booleans as
+# true/false and whole floats without ".0"; tables Arrow cannot write use to_csv.
+def _csv_bytes(df):
+    table = _arrow_or_frame(df)
+    if not isinstance(table, pa.Table):
+        return df.to_csv(index=False).encode('utf-8')
+    for i, field in enumerate(table.schema):
+        if pa.types.is_timestamp(field.type):
+            # Whole seconds, written like the timestamps shown in the table
+            table = table.set_column(i, field.name, table.column(i).cast(pa.timestamp('s', field.type.tz), safe=False))
+    sink = pa.BufferOutputStream()
+    try:
+        pa_csv.write_csv(table, sink, pa_csv.WriteOptions(quoting_style='needed'))
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        # Types the CSV writer does not support, e.g. lists from JSON arrays
+        return df.to_csv(index=False).encode('utf-8')
+    return sink.getvalue().to_pybytes()
+
+def numeric_view(df, cols, table_version, cache):
+    """
+    Returns (cols of df converted to numbers, names of the columns holding at least one
+    number), found in one vectorized pass. Columns that already have a numeric dtype are
+    taken as they are; only the others are converted. The result is kept in `cache` (a
+    dict) and reused while the table version and cols are unchanged, so plotting can
+    take its Y values from it instead of converting them again.
+    """
+    key = (table_version, cols)
+    if cache.get("key") != key:
+        coerced = df[list(cols)]
+        to_convert = [col for col in cols if not pd.api.types.is_numeric_dtype(coerced[col])]
+        if to_convert:
+            coerced[to_convert] = coerced[to_convert].apply(pd.to_numeric, errors='coerce')
+        cache.update(key=key, coerced=coerced, columns=coerced.columns[coerced.notna().any()].tolist())
+    return cache["coerced"], cache["columns"]
+
+def cached_summary(plot_df, plot_columns, plot_key, cache):
+    """Summary statistics of the plotted columns, kept in `cache` while plot_key is unchanged."""
+    return session_memo(cache, "summary", plot_key, lambda: plot_df[list(plot_columns)].describe())
+
+def parse_timestamps(timestamps, cache):
+    """
+    Converts a Series of timestamp strings to datetimes.
+    Parsed values are kept in `cache` (a dict), so only strings not seen on earlier
+    reruns are parsed.
+    """
+    if pd.api.types.is_datetime64_any_dtype(timestamps):
+        return timestamps # Live and database-loaded messages are datetime64 already
+    new_timestamps = list(set(timestamps) - cache.keys())
+    if new_timestamps:
+        if len(cache) + len(new_timestamps) > TIMESTAMP_CACHE_SIZE:
+            cache.clear()
+            new_timestamps = list(set(timestamps))
+        cache.update(zip(new_timestamps, pd.to_datetime(new_timestamps, format='ISO8601')))
+    return timestamps.map(cache)
+
+def reuse_figure(figures, chart_key, config):
+    """
+    Returns (figure, is_new) for a chart. The figure stored in `figures` on an earlier
+    rerun is reused while its config is unchanged, so updates only replace trace data
+    instead of rebuilding the traces and layout.
+    """
+    if chart_key in figures and figures[chart_key][0] == config:
+        return figures[chart_key][1], False
+    fig = go.Figure()
+    figures[chart_key] = (config, fig)
+    return fig, True
+
+def _minmax_indices(values, n_out):
+    """Sorted positions of the minimum and maximum of values in n_out // 2 equal buckets."""
+    bucket_size = -(-len(values) // max(1, n_out // 2))
+    # Padding completes the last bucket; it is never all NaN, so nanargmin/nanargmax are safe
+    buckets = np.pad(values, (0, -len(values) % bucket_size), constant_values=np.nan).reshape(-1, bucket_size)
+    starts = np.arange(0, len(values), bucket_size)
+    return np.unique(np.concatenate([starts + np.nanargmin(buckets, axis=1), starts + np.nanargmax(buckets, axis=1)]))
+
+# Not cached: charts only replace their trace data when the plotted data changes
+def _downsampled(x, y, n_out):
+    if LTTBDownsampler is not None and (pd.api.types.is_numeric_dtype(x) or pd.api.types.is_datetime64_any_dtype(x)):
+        x_values = x.to_numpy(dtype="int64") if pd.api.types.is_datetime64_any_dtype(x) else x.to_numpy(dtype="float64")
+        indices = LTTBDownsampler().downsample(x_values, y.to_numpy(dtype="float64"), n_out=n_out)
+        return x.iloc[indices], y.iloc[indices]
+    # Without tsdownsample (or with a non-numeric X axis), keep the lowest and highest
+    # point of each bucket, so peaks survive unlike with plain striding
+    indices = _minmax_indices(y.to_numpy(dtype="float64"), n_out)
+    return x.iloc[indices], y.iloc[indices]
+
+def downsample(x, y, n_out=DOWNSAMPLE_POINTS):
+    """Returns the (x, y) series to plot, reduced to about n_out points when longer."""
+    if len(y) <= n_out:
+        return x, y
+    return _downsampled(x, y, n_out)
@@ -4,16 +4,164 @@ import paho.mqtt.client as paho
 import time
 import threading
 import uuid
+import itertools
+from collections import deque
 from datetime import datetime
 import io # For CSV export/import operations
 import json # For JSON parsing
+import queue
+import selectors
+import socket
+
+try:
+    import orjson # Faster JSON parsing of incoming payloads
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+MAX_MSGS = 10_000 # Default number of received messages kept in memory, older ones are evicted
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+REFRESH_SECONDS = 2 # Interval of the received messages auto-refresh
+LARGE_PAYLOAD_BYTES = 64 * 1024 # Larger payloads only keep a text preview in the messages table
+PAYLOAD_PREVIEW_BYTES = 1024
+RECONNECT_DELAY = 5 # Seconds between reconnect attempts after a lost connection
+JSON_FIRST_BYTES = frozenset(b'{["tfn-0123456789') # Bytes a JSON document can start with
+
+def empty_messages_df():
+    """Empty received messages table; "Serial No." is carried by the index, not a column."""
+    return pd.DataFrame(columns=["Timestamp", "Topic", "Payload"], index=pd.RangeIndex(0, name="Serial No."))
+
+def local_timestamps(epoch_seconds):
+    """Converts a Series of epoch seconds to local datetime64 values, truncated to the second."""
+    local_tz = datetime.now().astimezone().tzinfo
+    return pd.to_datetime(epoch_seconds, unit='s', utc=True).dt.tz_convert(local_tz).dt.tz_localize(None).dt.floor('s')
+
+def format_timestamps(epoch_seconds):
+    """Formats a Series of epoch seconds as local time strings in one vectorized pass."""
+    return local_timestamps(epoch_seconds).dt.strftime(TIMESTAMP_FORMAT)
+
+# --- Shared Network Loop ---
+class SharedNetworkLoop:
+    """
+    Drives the network I/O of every MQTT client from a single selector thread, using
+    paho's external event loop hooks (loop_read/loop_write/loop_misc) instead of a
+    loop_start() thread per client.
+    """
+    def __init__(self):
+        self._selector = selectors.DefaultSelector()
+        self._sockets = {} # paho client -> its registered socket (None while not connected)
+        self._closing = set() # Clients disconnected on purpose, dropped once their socket closes
+        self._retry_at = {} # Client -> monotonic time of its next reconnect attempt
+        # Selector changes requested from other threads are applied by the loop thread
+        self._pending = queue.SimpleQueue()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._selector.register(self._wake_r, selectors.EVENT_READ, None)
+        self._thread = threading.Thread(target=self._run, name="mqtt-network-loop", daemon=True)
+        self._thread.start()
+
+    def add(self, client):
+        """Hooks a paho client into the loop. Must be called before client.connect()."""
+        client.on_socket_open = lambda c, userdata, sock: self._request("open", c, sock)
+        client.on_socket_close = lambda c, userdata, sock: self._request("close", c, sock)
+        client.on_socket_register_write = lambda c, userdata, sock: self._request("write_on", c, sock)
+        client.on_socket_unregister_write = lambda c, userdata, sock: self._request("write_off", c, sock)
+        self._request("add", client, None)
+
+    def remove(self, client):
+        """Stops driving a client once its socket is closed (call after client.disconnect())."""
+        self._request("remove", client, None)
+
+    def _request(self, op, client, sock):
+        if threading.current_thread() is self._thread:
+            self._apply(op, client, sock)
+        else:
+            self._pending.put((op, client, sock))
+            self._wake_w.send(b"\0")
+
+    def _apply(self, op, client, sock):
+        if op == "add":
+            self._sockets[client] = None
+        elif op == "open":
+            self._selector.register(sock, selectors.EVENT_READ, client)
+            self._sockets[client] = sock
+        elif op in ("write_on", "write_off"):
+            if self._sockets.get(client) is sock:
+                events = selectors.EVENT_READ | (selectors.EVENT_WRITE if op == "write_on" else 0)
+                self._selector.modify(sock, events, client)
+        elif op == "close":
+            if self._sockets.get(client) is sock:
+                self._selector.unregister(sock)
+                self._sockets[client] = None
+            if client in self._closing:
+                self._drop(client)
+            elif client in self._sockets:
+                self._retry_at[client] = time.monotonic() + RECONNECT_DELAY
+        elif op == "remove":
+            self._closing.add(client)
+            if self._sockets.get(client) is None:
+                self._drop(client)
+
+    def _drop(self, client):
+        self._sockets.pop(client, None)
+        self._closing.discard(client)
+        self._retry_at.pop(client, None)
+
+    def _run(self):
+        while True:
+            for key, events in self._selector.select(timeout=1.0):
+                client = key.data
+                if client is None: # Woken up by another thread, requests are applied below
+                    try:
+                        self._wake_r.recv(4096)
+                    except BlockingIOError:
+                        pass
+                    continue
+                # An error in one client's callbacks must not stop the loop for all the others
+                try:
+                    if events & selectors.EVENT_READ:
+                        client.loop_read()
+                    if events & selectors.EVENT_WRITE and self._sockets.get(client) is not None:
+                        client.loop_write()
+                except Exception as e:
+                    print(f"Error in MQTT network loop: {e}") # For console debugging
+            while True:
+                try:
+                    request = self._pending.get_nowait()
+                except queue.Empty:
+                    break
+                # A failed selector change (e.g. a socket closed in the meantime) only affects its client
+                try:
+                    self._apply(*request)
+                except Exception as e:
+                    print(f"Error applying MQTT network loop request {request[0]!r}: {e}") # For console debugging
+            # Keepalive pings and timeouts, plus reconnects of connections that were lost
+            now = time.monotonic()
+            for client, sock in list(self._sockets.items()):
+                if sock is not None:
+                    try:
+                        client.loop_misc()
+                    except Exception as e:
+                        print(f"Error in MQTT network loop: {e}") # For console debugging
+                elif now >= self._retry_at.get(client, float("inf")):
+                    try:
+                        client.reconnect()
+                        self._retry_at.pop(client, None)
+                    except Exception as e:
+                        print(f"Reconnect to MQTT broker failed: {e}") # For console debugging
+                        self._retry_at[client] = now + RECONNECT_DELAY
+
+@st.cache_resource
+def get_network_loop():
+    """The process-wide network loop shared by all sessions and clients."""
+    return SharedNetworkLoop()
 
 # --- MQTT Client Class (Encapsulated) ---
 class MqttClient:
     """
     A simple MQTT client class to handle connections, subscriptions, and publishing.
     """
-    def __init__(self, broker, port, client_id="", username=None, password=None):
+    def __init__(self, broker, port, client_id="", username=None, password=None, max_messages=MAX_MSGS):
         self.broker = broker
         self.port = port
         # Generate a unique client ID if not provided
@@ -26,53 +174,44 @@ class MqttClient:
         self.client.on_message = self._on_message
         self.client.on_publish = self._on_publish
         self.is_connected = False
-        self.messages_received = [] # To store received messages
-        self.json_messages = [] # To store parsed JSON messages
+        # The network thread only queues raw (timestamp, topic, payload) tuples; drain()
+        # turns them into rows in batches, on whichever thread reads the messages
+        self._inbox = queue.SimpleQueue()
+        # (level, text) status messages from callbacks, shown by the page with st.<level>()
+        self._notices = queue.SimpleQueue()
+        # Guards the buffers and counters below
+        self._lock = threading.Lock()
+        # Ring buffers: memory stays bounded however long the session runs
+        self.max_messages = max_messages
+        self.messages_received = deque(maxlen=max_messages) # To store received messages
+        self.json_messages = deque(maxlen=max_messages) # To store parsed JSON messages
+        self.received_count = 0 # Serial number of the newest received message
+        self._json_serial = itertools.count(1)
+        # Columns of the JSON table in first-seen order, extended as new keys show up
+        self.json_columns = pd.Index([])
 
         if self.username and self.password:
             self.client.username_pw_set(self.username, self.password)
 
     def _on_connect(self, client, userdata, flags, rc, properties):
         """Callback for when the client connects to the broker."""
+        # Runs on paho's network thread: Streamlit calls are left to the page (see pop_notices)
         if rc == 0:
             self.is_connected = True
-            st.success(f"Connected to MQTT Broker: {self.broker}:{self.port}")
+            self._notices.put(("success", f"Connected to MQTT Broker: {self.broker}:{self.port}"))
             print("Connected to MQTT Broker!") # For console debugging
         else:
             self.is_connected = False
-            st.error(f"Failed to connect, return code {rc}")
+            self._notices.put(("error", f"Failed to connect, return code {rc}"))
             print(f"Failed to connect, return code {rc}\n") # For console debugging
 
     def _on_message(self, client, userdata, msg):
         """Callback for when a message is received from the broker."""
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        try:
-            payload = msg.payload.decode('utf-8')
-        except UnicodeDecodeError:
-            payload = f"Non-UTF-8 payload (raw: {msg.payload})"
-
-        self.messages_received.append({
-            "Serial No.": len(self.messages_received) + 1,
-            "Timestamp": timestamp,
-            "Topic": msg.topic,
-            "Payload": payload
-        })
-        
-        # Try to parse JSON payload
-        try:
-            json_data = json.loads(payload)
-            # Flatten JSON for table display
-            flattened_json = self._flatten_json(json_data)
-            self.json_messages.append({
-                "Serial No.": len(self.json_messages) + 1,
-                "Timestamp": timestamp,
-                "Topic": msg.topic,
-                "JSON Data": json_data,
-                **flattened_json  # Add flattened key-value pairs
-            })
-        except (json.JSONDecodeError, TypeError):
-            # Not a valid JSON, skip JSON parsing
-            pass
+        # Timestamp is formatted with format_timestamps() when rows are rendered
+        self._inbox.put((time.time(), msg.topic, msg.payload))
+        # Nobody is reading (e.g. no page is refreshing): convert here so the inbox stays bounded
+        if self._inbox.qsize() >= self.max_messages:
+            self.drain()
             
         # Note: Avoid printing to console here in Streamlit as it can be overwhelming
         # st.rerun() # DO NOT call rerun directly from callback. It causes issues.
@@ -87,38 +226,55 @@ class MqttClient:
         """
         Flatten a nested JSON object for table display.
         """
-        items = []
-        if isinstance(json_obj, dict):
-            for k, v in json_obj.items():
-                new_key = f"{parent_key}{sep}{k}" if parent_key else k
+        result = {}
+        if not isinstance(json_obj, dict):
+            return result
+        # Iterative depth-first walk with a stack of (key prefix, item iterator, inside a list).
+        # Leaves are written straight into result in document order; a nested container
+        # pushes its own iterator and the parent resumes once it is exhausted.
+        stack = [(parent_key + sep if parent_key else '', iter(json_obj.items()), False)]
+        while stack:
+            prefix, items, in_list = stack[-1]
+            for k, v in items:
+                key = prefix + k
                 if isinstance(v, dict):
-                    items.extend(self._flatten_json(v, new_key, sep=sep).items())
-                elif isinstance(v, list):
+                    stack.append((key + sep, iter(v.items()), False))
+                    break
+                if isinstance(v, list) and not in_list:
+                    base = key + sep
+                    if any(isinstance(item, dict) for item in v):
+                        stack.append((base, zip(map(str, range(len(v))), v), True))
+                        break
+                    # Fast path for lists without dicts (e.g. sensor readings): no descent needed
                     for i, item in enumerate(v):
-                        if isinstance(item, dict):
-                            items.extend(self._flatten_json(item, f"{new_key}{sep}{i}", sep=sep).items())
-                        else:
-                            items.append((f"{new_key}{sep}{i}", item))
-                else:
-                    items.append((new_key, v))
-        return dict(items)
+                        result[base + str(i)] = item
+                    continue
+                result[key] = v
+            else:
+                stack.pop()
+        return result
 
     def connect(self):
         """Connects the MQTT client to the broker."""
+        # Network I/O runs on the shared loop thread rather than a loop_start() thread per client
+        network_loop = get_network_loop()
+        network_loop.add(self.client)
         try:
             self.client.connect(self.broker, self.port, 60)
-            self.client.loop_start() # Start a new thread that calls loop() for you
             time.sleep(1) # Give some time for connection to establish
         except Exception as e:
+            network_loop.remove(self.client)
             st.error(f"Error connecting to MQTT broker: {e}")
             print(f"Error connecting to MQTT broker: {e}") # For console debugging
             self.is_connected = False
 
     def disconnect(self):
         """Disconnects the MQTT client from the broker."""
+        # Also done for clients that never connected (e.g. refused CONNACK), which the
+        # shared network loop would otherwise keep reconnecting
+        self.client.disconnect()
+        get_network_loop().remove(self.client) # Released once the DISCONNECT packet is sent
         if self.is_connected:
-            self.client.loop_stop()
-            self.client.disconnect()
             self.is_connected = False
             print("Disconnected from MQTT Broker.") # For console debugging
 
@@ -149,13 +305,132 @@ class MqttClient:
         else:
             st.warning("Not connected to MQTT broker. Cannot unsubscribe.")
 
+    def pop_notices(self):
+        """Returns and clears the (level, text) status messages queued by the callbacks."""
+        notices = []
+        while True:
+            try:
+                notices.append(self._notices.get_nowait())
+            except queue.Empty:
+                return notices
+
+    def drain(self):
+        """Converts all queued messages into rows, appending them under a single lock acquisition."""
+        with self._lock:
+            received_rows = []
+            json_rows = []
+            while True:
+                try:
+                    timestamp, topic, raw = self._inbox.get_nowait()
+                except queue.Empty:
+                    break
+                if len(raw) > LARGE_PAYLOAD_BYTES:
+                    # Decoding the whole payload would double its memory for a cell nobody reads in full
+                    preview = raw[:PAYLOAD_PREVIEW_BYTES].decode('utf-8', errors='ignore')
+                    payload = f"{preview}... ({len(raw)} bytes)"
+                else:
+                    try:
+                        payload = raw.decode('utf-8')
+                    except UnicodeDecodeError:
+                        payload = f"Non-UTF-8 payload (raw: {raw})"
+                received_rows.append({
+                    "Timestamp": timestamp,
+                    "Topic": topic,
+                    "Payload": payload
+                })
+
+                # Payloads that cannot be JSON are skipped without raising and catching a parse error
+                stripped = raw.lstrip()
+                if not stripped or stripped[0] not in JSON_FIRST_BYTES:
+                    continue
+                # Try to parse JSON payload (straight from the raw bytes)
+                try:
+                    json_data = _json_loads(raw)
+                except (json.JSONDecodeError, UnicodeDecodeError, TypeError): # orjson's error subclasses json's
+                    # Not a valid JSON, skip JSON parsing
+                    continue
+                # Flattening for table display is left to json_messages_to_dataframe()
+                json_rows.append({
+                    "Serial No.": next(self._json_serial),
+                    "Timestamp": timestamp,
+                    "Topic": topic,
+                    "JSON Data": json_data,
+                    "RawJSON": raw,  # Original bytes, stored as-is by the database
+                })
+            self.messages_received.extend(received_rows)
+            self.received_count += len(received_rows)
+            self.json_messages.extend(json_rows)
+
+    def get_new_received_messages(self, since):
+        """
+        Returns (messages received after the first `since` ones, total received so far).
+        Only messages still in the buffer are returned; the i-th of them has serial
+        number total - len(messages) + 1 + i.
+        """
+        self.drain()
+        with self._lock:
+            new_count = min(self.received_count - since, len(self.messages_received))
+            if new_count <= 0:
+                return [], self.received_count
+            start = len(self.messages_received) - new_count
+            return list(itertools.islice(self.messages_received, start, None)), self.received_count
+
     def get_received_messages(self):
-        """Returns the list of messages received so far."""
-        return self.messages_received
+        """Returns a snapshot of the (most recent max_messages) messages received so far."""
+        self.drain()
+        with self._lock:
+            return list(self.messages_received)
 
     def get_json_messages(self):
-        """Returns the list of parsed JSON messages received so far."""
-        return self.json_messages
+        """Returns a snapshot of the (most recent max_messages) parsed JSON messages."""
+        self.drain()
+        with self._lock:
+            return list(self.json_messages)
+
+    def get_new_json_messages_since(self, serial):
+        """Returns the parsed JSON messages still in the buffer with a Serial No. above `serial`."""
+        self.drain()
+        with self._lock:
+            if not self.json_messages:
+                return []
+            new_count = min(self.json_messages[-1]["Serial No."] - serial, len(self.json_messages))
+            if new_count <= 0:
+                return []
+            # Walked from the newest end: indexing into a deque from the left would cost
+            # O(buffer size) on every refresh instead of O(new messages)
+            new_messages = list(itertools.islice(reversed(self.json_messages), new_count))
+        new_messages.reverse()
+        return new_messages
+
+    def clear_json_messages(self):
+        """Drops the parsed JSON messages received so far."""
+        self.drain()
+        with self._lock:
+            self.json_messages.clear()
+        self.json_columns = pd.Index([])
+
+    def json_messages_to_dataframe(self, messages):
+        """
+        Builds the JSON messages table, adding the flattened key-value pairs of each
+        message's JSON Data as columns. Done at render time for the rows being shown,
+        instead of on the network thread for every message.
+        """
+        df = pd.DataFrame(messages)
+        if df.empty:
+            return df
+        # Kept as datetime64 for plotting; it is only turned into text for display and storage
+        df["Timestamp"] = local_timestamps(df["Timestamp"])
+        flat = pd.DataFrame([self._flatten_json(msg["JSON Data"]) for msg in messages], index=df.index)
+        # A JSON key named like a metadata column replaces it, where the message has it
+        for col in flat.columns.intersection(df.columns):
+            df[col] = flat.pop(col).combine_first(df[col])
+        df = df.join(flat)
+        # Keep one column layout for every table built from this client, whatever order
+        # the keys arrive in; keys only seen in evicted messages stay as empty columns
+        new_columns = df.columns.difference(self.json_columns, sort=False)
+        if len(new_columns):
+            self.json_columns = self.json_columns.append(new_columns)
+        return df.reindex(columns=self.json_columns)
 
 # --- Streamlit Page Configuration ---
 st.set_page_config(layout="wide", page_title="MQTT Client")
@@ -173,14 +448,15 @@ if 'publish_thread_running' not in st.session_state:
 if 'stop_publish_event' not in st.session_state:
     st.session_state.stop_publish_event = threading.Event()
 if 'messages_df' not in st.session_state:
-    st.session_state.messages_df = pd.DataFrame(columns=["Serial No.", "Timestamp", "Topic", "Payload"])
+    st.session_state.messages_df = empty_messages_df()
 if 'json_messages_df' not in st.session_state:
     st.session_state.json_messages_df = pd.DataFrame()
 if 'auto_publish_messages' not in st.session_state:
-    st.session_state.auto_publish_messages = [
+    # Kept as a DataFrame: st.data_editor edits it natively and the publisher iterates its rows
+    st.session_state.auto_publish_messages = pd.DataFrame([
         {"Topic": "test/message", "Payload": "Message 1", "QoS": 0, "Retain": False},
         {"Topic": "test/message", "Payload": "Message 2", "QoS": 1, "Retain": True}
-    ]
+    ])
 if 'broker_address' not in st.session_state:
     st.session_state.broker_address = "localhost" # Default public broker (changed from localhost for easier testing)
 if 'broker_port' not in st.session_state:
@@ -193,6 +469,8 @@ if 'password' not in st.session_state:
     st.session_state.password = ""
 if 'show_password' not in st.session_state:
     st.session_state.show_password = False
+if 'max_messages' not in st.session_state:
+    st.session_state.max_messages = MAX_MSGS
 if 'last_message_count' not in st.session_state: # Added for more robust message display update
     st.session_state.last_message_count = 0
 if 'last_json_message_count' not in st.session_state:
@@ -203,6 +481,16 @@ if 'auto_refresh_messages' not in st.session_state:
 
 # --- Helper Functions for UI Interactions ---
 
+def received_messages_csv(messages_df):
+    """CSV bytes of the received messages table, rebuilt only when new messages were appended."""
+    # Kept per session next to the table it was built from. Appends replace the table, and
+    # unlike the last serial it cannot repeat after a reconnect restarts the numbering.
+    cached = st.session_state.get('received_messages_csv')
+    if cached is None or cached[0] is not messages_df:
+        cached = (messages_df, messages_df.to_csv().encode('utf-8')) # The index is written as the "Serial No." column
+        st.session_state.received_messages_csv = cached
+    return cached[1]
+
 def connect_mqtt_ui():
     """Handles the MQTT connection logic based on UI inputs."""
     broker = st.session_state.broker_address
@@ -211,10 +499,16 @@ def connect_mqtt_ui():
     username = st.session_state.username if st.session_state.username else None
     password = st.session_state.password if st.session_state.password else None
 
-    if st.session_state.mqtt_client and st.session_state.mqtt_client.is_connected:
-        st.session_state.mqtt_client.disconnect() # Disconnect existing if any
+    if st.session_state.mqtt_client:
+        st.session_state.mqtt_client.disconnect() # Release the existing client, connected or not
 
-    st.session_state.mqtt_client = MqttClient(broker, port, client_id, username, password)
+    st.session_state.mqtt_client = MqttClient(broker, port, client_id, username, password,
+                                              max_messages=st.session_state.max_messages)
+    # The new client starts with an empty message list
+    st.session_state.messages_df = empty_messages_df()
+    st.session_state.last_message_count = 0
+    st.session_state.last_json_message_count = 0
+    st.session_state.json_df_live = False # The JSON page rebuilds its table from the new client
     st.session_state.mqtt_client.connect()
     st.session_state.is_mqtt_connected = st.session_state.mqtt_client.is_connected
     # A Streamlit rerun will update the UI components based on this state change.
@@ -231,7 +525,7 @@ def disconnect_mqtt_ui():
             time.sleep(0.1) # Give a small moment for the thread to register the signal
         st.session_state.publish_thread_running = False
         st.session_state.stop_publish_event.clear() # Reset for next run
-        st.session_state.messages_df = pd.DataFrame(columns=["Serial No.", "Timestamp", "Topic", "Payload"]) # Clear messages
+        st.session_state.messages_df = empty_messages_df() # Clear messages
         st.session_state.last_message_count = 0 # Reset message count
         st.session_state.json_messages_df = pd.DataFrame() # Clear JSON messages
         st.session_state.last_json_message_count = 0 # Reset JSON message count
@@ -312,28 +606,35 @@ def stop_periodic_publisher():
 
 def periodic_publisher_task(mqtt_client_instance, messages, interval, stop_event):
     """The target function for the periodic publishing thread."""
+    # Encode payloads once; the loop only hands ready-made bytes to paho
+    prepared = [(msg.Topic, str(msg.Payload).encode('utf-8'), msg.QoS, msg.Retain)
+                for msg in messages.itertuples(index=False)]
+    paho_client = mqtt_client_instance.client
     while not stop_event.is_set():
-        for msg in messages:
+        for topic, payload, qos, retain in prepared:
             if stop_event.is_set():
                 break # Exit if stop signal received during iteration
-            mqtt_client_instance.publish(msg['Topic'], msg['Payload'], qos=msg.get('QoS', 0), retain=msg.get('Retain', False))
+            if mqtt_client_instance.is_connected:
+                paho_client.publish(topic, payload, qos, retain)
             time.sleep(interval)
     print("Periodic publisher thread gracefully terminated.") # For console debugging
 
 def load_periodic_messages_from_csv(uploaded_file):
     """Loads periodic messages from an uploaded CSV file."""
     try:
-        df = pd.read_csv(uploaded_file)
-        expected_cols = {"Topic", "Payload", "QoS", "Retain"}
+        # Topic/Payload are read as text directly; true/false and 1/0 Retain columns are
+        # already parsed to bool/int by the C parser
+        df = pd.read_csv(uploaded_file, dtype={"Topic": str, "Payload": str})
+        expected_cols = ["Topic", "Payload", "QoS", "Retain"]
         
         # Check for missing required columns
-        missing_cols = list(expected_cols - set(df.columns))
+        missing_cols = [col for col in expected_cols if col not in df.columns]
         if missing_cols:
             st.error(f"Error: CSV is missing required columns: {', '.join(missing_cols)}. Please ensure your CSV has 'Topic', 'Payload', 'QoS', 'Retain'.")
             return
         
         # Select only the expected columns and make a copy to avoid SettingWithCopyWarning
-        df_processed = df[list(expected_cols)].copy()
+        df_processed = df[expected_cols].copy()
 
         # Robust conversion for QoS
         df_processed["QoS"] = pd.to_numeric(df_processed["QoS"], errors='coerce')
@@ -341,18 +642,22 @@ def load_periodic_messages_from_csv(uploaded_file):
             st.warning("Warning: Some 'QoS' values in CSV could not be converted to numbers. Defaulting to 0 for those rows.")
         df_processed["QoS"] = df_processed["QoS"].fillna(0).astype(int)
 
-        # Robust conversion for Retain
-        # Convert to string, then lower, then map explicit 'true'/'1' to True, others to False
-        df_processed["Retain"] = df_processed["Retain"].astype(str).str.lower().isin(['true', '1'])
+        # Robust conversion for Retain: explicit 'true'/'1' are True, others False.
+        # Only mixed/text columns need the string pass.
+        retain = df_processed["Retain"]
+        if pd.api.types.is_bool_dtype(retain):
+            pass
+        elif pd.api.types.is_numeric_dtype(retain):
+            df_processed["Retain"] = retain.eq(1)
+        else:
+            df_processed["Retain"] = retain.astype(str).str.lower().isin(['true', '1'])
 
-        messages_list = df_processed.to_dict(orient="records")
-        
-        if not messages_list:
+        if df_processed.empty:
             st.warning("The CSV file was processed, but no valid messages were found after parsing. Please check the CSV content and formatting.")
-            st.session_state.auto_publish_messages = [] # Explicitly ensure it's empty
+            st.session_state.auto_publish_messages = df_processed # Explicitly ensure it's empty
         else:
-            st.session_state.auto_publish_messages = messages_list
-            st.success(f"Successfully loaded {len(messages_list)} messages from CSV.")
+            st.session_state.auto_publish_messages = df_processed.reset_index(drop=True)
+            st.success(f"Successfully loaded {len(df_processed)} messages from CSV.")
         
         
         
@@ -378,6 +683,7 @@ with st.sidebar.form("mqtt_config_form"):
     password_type = "text" if st.session_state.show_password else "password"
     st.session_state.password = st.text_input("Password (optional)", type=password_type, value=st.session_state.password, key="password_input")
     st.session_state.show_password = st.checkbox("Show Password", value=st.session_state.show_password, key="show_password_checkbox")
+    st.session_state.max_messages = st.number_input("Messages kept in memory", value=st.session_state.max_messages, min_value=100, step=1000, key="max_messages_input", help="Older messages are dropped once this many have been received (applies on connect)")
 
     col_connect, col_disconnect = st.columns(2)
     with col_connect:
@@ -524,7 +830,7 @@ with col2:
         auto_refresh_enabled = st.checkbox(
             "Auto-refresh messages",
             value=st.session_state.auto_refresh_messages,
-            help="Automatically refresh the message table every 2 seconds",
+            help=f"Automatically refresh the message table every {REFRESH_SECONDS} seconds",
             key="auto_refresh_messages_checkbox"
         )
         st.session_state.auto_refresh_messages = auto_refresh_enabled
@@ -533,61 +839,64 @@ with col2:
         if st.button("Manual Refresh", help="Manually refresh to get the latest messages"):
             st.rerun()
     
-    # Placeholder for messages, will be updated periodically
-    message_placeholder = st.empty()
+    # --- Message Update Logic ---
+    # Runs on every full rerun and, with auto-refresh on, every REFRESH_SECONDS as a
+    # fragment rerun that re-executes only this block instead of the whole page.
+    # New messages received by the MQTT client's background thread are collected here.
+    auto_refresh_active = st.session_state.auto_refresh_messages and st.session_state.is_mqtt_connected
+
+    @st.fragment(run_every=REFRESH_SECONDS if auto_refresh_active else None)
+    def received_messages_view():
+        if st.session_state.mqtt_client:
+            for level, text in st.session_state.mqtt_client.pop_notices():
+                getattr(st, level)(text)
+        if not (st.session_state.mqtt_client and st.session_state.is_mqtt_connected):
+            st.info("Connect to the MQTT broker to start receiving messages.")
+            return
 
-    # --- Message Update Logic (Rely on Streamlit's natural reruns) ---
-    # This section gets executed on every Streamlit rerun (e.g., user interaction, button click).
-    # New messages received by the MQTT client's background thread will be collected here.
-    if st.session_state.mqtt_client and st.session_state.is_mqtt_connected:
-        new_messages = st.session_state.mqtt_client.get_received_messages()
-        new_json_messages = st.session_state.mqtt_client.get_json_messages()
-        
-        # Only update DataFrame and re-render if there are new messages, or if it was empty
-        # and now has messages. This helps prevent unnecessary dataframe re-creations.
-        if new_messages and (len(new_messages) != len(st.session_state.messages_df) or st.session_state.messages_df.empty):
-            st.session_state.messages_df = pd.DataFrame(new_messages)
-            st.session_state.messages_df["Serial No."] = range(1, len(st.session_state.messages_df) + 1)
-            st.session_state.messages_df = st.session_state.messages_df[["Serial No.", "Timestamp", "Topic", "Payload"]]
-            
-        # Update JSON messages DataFrame
-        if new_json_messages and (len(new_json_messages) != len(st.session_state.json_messages_df) or st.session_state.json_messages_df.empty):
-            st.session_state.json_messages_df = pd.DataFrame(new_json_messages)
-            
-        with message_placeholder.container():
-            if not st.session_state.messages_df.empty:
-                st.dataframe(st.session_state.messages_df, height=300, use_container_width=True)
-
-                # --- Export Received Messages to CSV ---
-                # Ensure data is encoded for download button
-                csv_data = st.session_state.messages_df.to_csv(index=False).encode('utf-8')
-                st.download_button(
-                    label="Export Received Messages to CSV",
-                    data=csv_data,
-                    file_name=f"mqtt_received_messages_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                    mime="text/csv",
-                    disabled=st.session_state.messages_df.empty,
-                    key="download_received_csv"
-                )
+        # Only convert the messages that arrived since the last rerun and append them,
+        # instead of rebuilding the whole DataFrame every time. last_message_count holds
+        # the last serial shown, which stays valid once the client evicts old messages.
+        new_messages, total_received = st.session_state.mqtt_client.get_new_received_messages(
+            st.session_state.last_message_count)
+        if new_messages:
+            # Serial numbers come from the index instead of being stored in every row
+            first_serial = total_received - len(new_messages) + 1
+            delta_df = pd.DataFrame(new_messages, columns=["Timestamp", "Topic", "Payload"],
+                                    index=pd.RangeIndex(first_serial, total_received + 1, name="Serial No."))
+            delta_df["Timestamp"] = format_timestamps(delta_df["Timestamp"])
+            if st.session_state.messages_df.empty:
+                st.session_state.messages_df = delta_df
             else:
-                st.info("Waiting for messages...")
-    else:
-        with message_placeholder.container():
-            st.info("Connect to the MQTT broker to start receiving messages.")
+                st.session_state.messages_df = pd.concat([st.session_state.messages_df, delta_df])
+            # Evict the same rows the client's ring buffer dropped
+            max_messages = st.session_state.mqtt_client.max_messages
+            if len(st.session_state.messages_df) > max_messages:
+                st.session_state.messages_df = st.session_state.messages_df.iloc[-max_messages:]
+        st.session_state.last_message_count = total_received
+            
+        if not st.session_state.messages_df.empty:
+            st.dataframe(st.session_state.messages_df, height=300, use_container_width=True)
+
+            # --- Export Received Messages to CSV ---
+            csv_data = received_messages_csv(st.session_state.messages_df)
+            st.download_button(
+                label="Export Received Messages to CSV",
+                data=csv_data,
+                file_name=f"mqtt_received_messages_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+                mime="text/csv",
+                disabled=st.session_state.messages_df.empty,
+                key="download_received_csv"
+            )
+        else:
+            st.info("Waiting for messages...")
+
+    received_messages_view()
 
-# Auto-refresh mechanism for received messages
+# Auto-refresh status for received messages
 if (st.session_state.auto_refresh_messages and 
     st.session_state.is_mqtt_connected):
-    
-    # Show auto-refresh status
-    st.info("🔄 Auto-refresh enabled - Messages will update automatically every 2 seconds")
-    
-    # Import time for the delay
-    import time
-    
-    # Wait 2 seconds before triggering refresh
-    time.sleep(2)
-    st.rerun()
+    st.info(f"🔄 Auto-refresh enabled - Messages will update automatically every {REFRESH_SECONDS} seconds")
 
 elif (st.session_state.auto_refresh_messages and 
       not st.session_state.is_mqtt_connected):
@@ -1,26 +1,68 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import json
-import time
 from datetime import datetime
 import plotly.express as px
 import plotly.graph_objects as go
+from plotly.subplots import make_subplots
 from database import JSONMessageDB
+from json_view import append_rows, arrow_table, cached_summary, csv_bytes, downsample, numeric_view, parse_timestamps, reuse_figure
 
 # --- Streamlit Page Configuration ---
 st.set_page_config(layout="wide", page_title="Parsed JSON Messages")
 
-# Initialize database
-if 'json_db' not in st.session_state:
-    st.session_state.json_db = JSONMessageDB()
+DB_PAGE_SIZE = 100 # Messages fetched per database page
+REFRESH_SECONDS = 2 # Interval of the JSON messages auto-refresh
+MARKER_MAX_POINTS = 5_000 # Longer series are drawn as plain lines
+WEBGL_MIN_POINTS = 1_000 # Longer series are drawn with WebGL (Scattergl) instead of SVG
+FUSED_TRACE_MIN_SERIES = 6 # More Y series than this are drawn as a single combined trace
+HIDDEN_COLUMNS = ['JSON Data', 'RawJSON', 'Created At'] # Not shown in the messages table
+METADATA_COLUMNS = frozenset(["Serial No.", "Timestamp", "Topic", "JSON Data", "RawJSON"]) # Not offered as plot data
+TABLE_MAX_ROWS = 500 # Newest rows rendered in the messages table
+
+# Cached database lookups for UI counters. The key includes the database's
+# data_version, which every write bumps, so results refresh as soon as data changes.
+@st.cache_data(ttl=2.0, show_spinner=False)
+def cached_message_count(db_path, data_version, _db):
+    return _db.get_message_count()
+
+@st.cache_data(ttl=2.0, show_spinner=False)
+def cached_topics(db_path, data_version, _db):
+    return _db.get_topics()
+
+# CSV of every stored message (without payloads), or None when the database is empty
+@st.cache_data(ttl=2.0, max_entries=2, show_spinner=False)
+def cached_db_csv(db_path, data_version, _db):
+    # Payloads are not exported, so they are not even read
+    db_df = _db.get_messages_df(limit=None, payloads=False)
+    if db_df.empty:
+        return None
+    return db_df.to_csv(index=False).encode('utf-8')
+
+def load_db_page(before=None):
+    """
+    Reads one DB_PAGE_SIZE page of messages into a table, newest first, and returns it
+    with the cursor of the next (older) page. Text timestamps are parsed once here, so
+    plotting gets datetime64 values like those of live messages.
+    """
+    df, cursor = get_json_db().get_messages_df_page(DB_PAGE_SIZE, before=before)
+    try:
+        df["Timestamp"] = pd.to_datetime(df["Timestamp"], format="ISO8601")
+    except (ValueError, TypeError):
+        pass # Left as text; parse_timestamps() handles it when plotting
+    return df, cursor
+
+# One database instance (connection, writer thread) shared by all sessions of the process.
+# Looked up at each use rather than kept in session state, so fragment reruns of every
+# session pick up the instance recreated after "Delete Database File".
+@st.cache_resource
+def get_json_db():
+    return JSONMessageDB()
 
 # Initialize session state for graph settings
 if 'auto_update_graph' not in st.session_state:
     st.session_state.auto_update_graph = False
-if 'selected_x_axis' not in st.session_state:
-    st.session_state.selected_x_axis = "Timestamp"
-if 'selected_y_axes' not in st.session_state:
-    st.session_state.selected_y_axes = []
 if 'last_json_message_count' not in st.session_state:
     st.session_state.last_json_message_count = 0
 if 'multi_graph_enabled' not in st.session_state:
@@ -29,42 +71,32 @@ if 'use_database' not in st.session_state:
     st.session_state.use_database = True
 if 'auto_save_to_db' not in st.session_state:
     st.session_state.auto_save_to_db = True
-
-# --- Auto-refresh data from MQTT client ---
-# Check if MQTT client exists and is connected, then fetch latest JSON messages
-if ('mqtt_client' in st.session_state and 
-    st.session_state.mqtt_client and 
-    hasattr(st.session_state, 'is_mqtt_connected') and 
-    st.session_state.is_mqtt_connected):
-    
-    # Get the latest JSON messages from the MQTT client
-    latest_json_messages = st.session_state.mqtt_client.get_json_messages()
-    
-    # Update the JSON messages DataFrame if there are new messages
-    if latest_json_messages:
-        current_message_count = len(latest_json_messages)
-        
-        # Only update if we have new messages or if the DataFrame is empty
-        if (current_message_count != st.session_state.last_json_message_count or 
-            'json_messages_df' not in st.session_state or 
-            st.session_state.json_messages_df.empty):
-            
-            st.session_state.json_messages_df = pd.DataFrame(latest_json_messages)
-            
-            # Auto-save new messages to database if enabled
-            if (st.session_state.auto_save_to_db and 
-                latest_json_messages and
-                st.session_state.use_database and
-                current_message_count > st.session_state.last_json_message_count):
-                
-                # Save only new messages to database
-                new_messages = latest_json_messages[st.session_state.last_json_message_count:]
-                try:
-                    st.session_state.json_db.insert_messages_batch(new_messages)
-                except Exception as e:
-                    st.error(f"Error saving to database: {e}")
-            
-            st.session_state.last_json_message_count = current_message_count
+if 'db_cursor' not in st.session_state:
+    st.session_state.db_cursor = None # Keyset cursor of the next (older) database page
+if 'timestamp_cache' not in st.session_state:
+    st.session_state.timestamp_cache = {} # Timestamp string -> parsed datetime
+if 'db_autoloaded' not in st.session_state:
+    st.session_state.db_autoloaded = False # An empty table was already filled from the database (or tried to be)
+if 'db_write_base' not in st.session_state:
+    st.session_state.db_write_base = None # Database writer's (dropped, failed) totals when this session started saving
+if 'json_df_live' not in st.session_state:
+    st.session_state.json_df_live = False # Table holds the MQTT client's messages (not a database page)
+if 'json_figures' not in st.session_state:
+    st.session_state.json_figures = {} # Chart key -> (config, figure) reused across graph updates
+if 'figure_data_keys' not in st.session_state:
+    st.session_state.figure_data_keys = {}
+if 'last_plot_key' not in st.session_state:
+    st.session_state.last_plot_key = None # (X axis, Y axes, table version) of last_plot_df
+    st.session_state.last_plot_df = None
+if 'numeric_view_cache' not in st.session_state:
+    st.session_state.numeric_view_cache = {} # Numeric conversion of the table's data columns
+if 'table_version' not in st.session_state:
+    st.session_state.table_version = 0 # Bumped whenever json_messages_df is replaced
+    st.session_state.table_source = None # json_messages_df that table_version was taken for
+if 'table_cache' not in st.session_state:
+    st.session_state.table_cache = {} # Data derived from the table, see json_view.session_memo
+if 'raw_json_count' not in st.session_state:
+    st.session_state.raw_json_count = 20 # Messages rendered in the raw JSON expander
 
 st.title("Parsed JSON Messages")
 
@@ -98,121 +130,20 @@ with col_config2:
 
 st.write("---")  # Separator
 
-# Check if we have JSON messages data
-current_has_data = ('json_messages_df' in st.session_state and 
-                   not st.session_state.json_messages_df.empty)
-
-# If using database and no current data, try to load from database
-if (st.session_state.use_database and 
-    not current_has_data):
-    try:
-        db_messages = st.session_state.json_db.get_all_messages()
-        if db_messages:
-            st.session_state.json_messages_df = pd.DataFrame(db_messages)
-            current_has_data = True
-    except Exception as e:
-        st.error(f"Error loading from database: {e}")
-
-if not current_has_data:
-    st.info("No JSON messages available. Please connect to the MQTT broker and receive some JSON messages first.")
-    st.markdown("**Note:** JSON messages will appear here when valid JSON payloads are received on the MQTT Client page.")
-    
-    # Show connection status
-    if ('mqtt_client' in st.session_state and 
-        st.session_state.mqtt_client and 
-        hasattr(st.session_state, 'is_mqtt_connected')):
-        if st.session_state.is_mqtt_connected:
-            st.success("MQTT Client is connected. Waiting for JSON messages...")
-        else:
-            st.warning("MQTT Client is not connected. Please connect on the MQTT Client page.")
-    else:
-        st.info("Please visit the MQTT Client page to establish a connection.")
-        
-else:
-    # Display JSON messages
-    st.subheader("JSON Messages Table")
-    
-    # Show message count and last update info
-    col_info1, col_info2, col_info3 = st.columns(3)
-    with col_info1:
-        current_count = len(st.session_state.json_messages_df)
-        st.metric("Current Messages", current_count)
-    with col_info2:
-        if not st.session_state.json_messages_df.empty:
-            last_message_time = st.session_state.json_messages_df.iloc[-1]['Timestamp']
-            st.metric("Last Message", last_message_time)
-    with col_info3:
-        connection_status = "Connected" if (hasattr(st.session_state, 'is_mqtt_connected') and st.session_state.is_mqtt_connected) else "Disconnected"
-        st.metric("MQTT Status", connection_status)
-    
-    # Data source indicator
-    if st.session_state.use_database:
-        try:
-            db_count = st.session_state.json_db.get_message_count()
-            st.info(f"📊 Database contains {db_count} total messages | Showing {len(st.session_state.json_messages_df)} messages")
-        except:
-            st.info("📊 Using database storage")
-    else:
-        st.info("📊 Using session storage only (data will be lost on page refresh)")
-    
-    # Create a display DataFrame without the raw JSON Data column for cleaner view
-    display_df = st.session_state.json_messages_df.drop(columns=['JSON Data', 'Created At'], errors='ignore')
-    st.dataframe(display_df, height=300, use_container_width=True)
-    
-    # Show expandable raw JSON data
-    with st.expander("View Raw JSON Data"):
-        for idx, row in st.session_state.json_messages_df.iterrows():
-            st.write(f"**Message {row['Serial No.']} ({row['Timestamp']}) - Topic: {row['Topic']}**")
-            st.json(row['JSON Data'])
-            st.write("---")
-    
-    # --- Export JSON Messages to CSV ---
-    json_csv_data = display_df.to_csv(index=False).encode('utf-8')
-    st.download_button(
-        label="Export JSON Messages to CSV",
-        data=json_csv_data,
-        file_name=f"mqtt_json_messages_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-        mime="text/csv",
-        disabled=st.session_state.json_messages_df.empty,
-        key="download_json_csv"
-    )
-    
-    # Export from database option
-    if st.session_state.use_database:
-        try:
-            db_messages = st.session_state.json_db.get_all_messages()
-            if db_messages:
-                db_df = pd.DataFrame(db_messages).drop(columns=['JSON Data', 'Created At'], errors='ignore')
-                db_csv_data = db_df.to_csv(index=False).encode('utf-8')
-                st.download_button(
-                    label="Export All DB Messages to CSV",
-                    data=db_csv_data,
-                    file_name=f"mqtt_all_db_messages_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                    mime="text/csv",
-                    key="download_db_csv"
-                )
-        except Exception as e:
-            st.error(f"Error preparing database export: {e}")
-    
-    # --- JSON Data Visualization ---
+# Graph controls and charts. Changing a control reruns only this panel, not the message
+# ingest and table above it; it is also rerun with fresh data by json_messages_view.
+@st.fragment
+def graph_panel(display_df, table_version):
     st.subheader("JSON Data Visualization")
     
     # Identify data columns (excluding metadata columns)
-    metadata_columns = {"Serial No.", "Timestamp", "Topic", "JSON Data"}
-    data_columns = [col for col in display_df.columns if col not in metadata_columns]
+    data_columns = [col for col in display_df.columns if col not in METADATA_COLUMNS]
     
     if not data_columns:
         st.info("No data columns found in JSON messages for visualization. JSON messages need to contain numeric data fields.")
     else:
         # Identify numeric columns for Y-axis
-        numeric_columns = []
-        for col in data_columns:
-            try:
-                # Try to convert to numeric, if successful, it's a numeric column
-                pd.to_numeric(display_df[col], errors='coerce')
-                numeric_columns.append(col)
-            except:
-                pass
+        numeric_df, numeric_columns = numeric_view(display_df, tuple(data_columns), table_version, st.session_state.numeric_view_cache)
         
         if not numeric_columns:
             st.info("No numeric columns found in JSON data for visualization.")
@@ -228,16 +159,13 @@ else:
                     index=0 if "Timestamp" in x_axis_options else 0,
                     key="x_axis_select"
                 )
-                st.session_state.selected_x_axis = selected_x_axis
                 
                 # Y-Axis Selection (Multi-select)
                 selected_y_axes = st.multiselect(
                     "Select Y-Axis (Multiple selection allowed)",
                     options=numeric_columns,
-                    default=st.session_state.selected_y_axes if st.session_state.selected_y_axes else [],
                     key="y_axis_multiselect"
                 )
-                st.session_state.selected_y_axes = selected_y_axes
             
             with col2:
                 # Auto Update Graph Checkbox
@@ -247,7 +175,10 @@ else:
                     help="Automatically update the graph when new JSON messages are received",
                     key="auto_update_checkbox"
                 )
-                st.session_state.auto_update_graph = auto_update
+                if auto_update != st.session_state.auto_update_graph:
+                    # The refresh interval is set when the page runs, so apply the change there
+                    st.session_state.auto_update_graph = auto_update
+                    st.rerun()
                 
                 # Multi Graph Checkbox
                 multi_graph = st.checkbox(
@@ -273,110 +204,148 @@ else:
                     st.warning("Please select at least one Y-axis column to generate the graph.")
                 else:
                     try:
-                        # Prepare data for plotting
-                        plot_df = display_df.copy()
-                        
-                        # Convert timestamp to datetime if X-axis is Timestamp
-                        if selected_x_axis == "Timestamp":
-                            try:
-                                plot_df["Timestamp"] = pd.to_datetime(plot_df["Timestamp"])
-                            except:
-                                st.error("Could not convert Timestamp to datetime format for plotting.")
-                                st.stop()
-                        
-                        # Convert Y-axis columns to numeric
-                        for col in selected_y_axes:
-                            plot_df[col] = pd.to_numeric(plot_df[col], errors='coerce')
-                        
-                        # Remove rows with NaN values in selected columns
-                        plot_columns = [selected_x_axis] + selected_y_axes
-                        plot_df = plot_df.dropna(subset=plot_columns)
+                        plot_columns = list(dict.fromkeys([selected_x_axis] + selected_y_axes))
+                        # Reruns where neither the data nor the selection changed reuse the prepared data
+                        plot_key = (selected_x_axis, tuple(selected_y_axes), table_version)
+                        figure_data_keys = st.session_state.figure_data_keys # Chart key -> plot_key of its trace data
+                        if plot_key != st.session_state.last_plot_key:
+                            # Prepare data for plotting: copy only the plotted columns
+                            plot_df = display_df.loc[:, plot_columns].copy()
+                            
+                            # Convert timestamp to datetime if X-axis is Timestamp (text only when it could not be parsed at load)
+                            if selected_x_axis == "Timestamp":
+                                try:
+                                    # Parse only timestamps not seen on earlier reruns
+                                    plot_df["Timestamp"] = parse_timestamps(plot_df["Timestamp"], st.session_state.timestamp_cache)
+                                except:
+                                    st.error("Could not convert Timestamp to datetime format for plotting.")
+                                    st.stop()
+                            
+                            # Convert Y-axis columns to numeric
+                            plot_df[selected_y_axes] = numeric_df[selected_y_axes] # Converted when detecting numeric columns
+                            
+                            # Remove rows with missing or non-finite values in selected columns. Checked with one
+                            # mask, so the common case of all rows being valid keeps plot_df without a copy.
+                            valid = np.isfinite(plot_df[selected_y_axes].to_numpy(dtype=float)).all(axis=1) & plot_df[selected_x_axis].notna().to_numpy()
+                            if not valid.all():
+                                plot_df = plot_df[valid]
+                            st.session_state.last_plot_df = plot_df
+                            st.session_state.last_plot_key = plot_key
+                        else:
+                            plot_df = st.session_state.last_plot_df
                         
                         if plot_df.empty:
                             st.warning("No valid data points found for the selected columns after removing invalid values.")
                         else:
+                            # Per-point markers are skipped on long series, the lines alone stay readable
+                            trace_mode = 'lines+markers' if len(plot_df) <= MARKER_MAX_POINTS else 'lines'
+                            # WebGL keeps long series interactive; short ones are drawn as SVG, which
+                            # needs no WebGL context (browsers allow only a few per page)
+                            trace_type = go.Scattergl if len(plot_df) > WEBGL_MIN_POINTS else go.Scatter
+                            
                             # Check if multi-graph mode is enabled
                             if st.session_state.multi_graph_enabled:
                                 # Create separate graphs for each Y-axis
                                 st.subheader("Multi-Graph Visualization")
                                 
-                                # Calculate number of columns for layout (max 2 columns)
+                                # One figure with a subplot per Y axis (up to 2 per row), drawn by a
+                                # single chart instead of one chart per column; reused by later updates
                                 num_graphs = len(selected_y_axes)
                                 cols_per_row = min(2, num_graphs)
+                                num_rows = -(-num_graphs // cols_per_row)
+                                fig, is_new_fig = reuse_figure(st.session_state.json_figures, "multi", (selected_x_axis, tuple(selected_y_axes), trace_mode, trace_type))
+                                if is_new_fig:
+                                    # Lays out the stored figure in place
+                                    make_subplots(
+                                        rows=num_rows,
+                                        cols=cols_per_row,
+                                        subplot_titles=[f"{y_col} vs {selected_x_axis}" for y_col in selected_y_axes],
+                                        figure=fig
+                                    )
+                                    fig.add_traces(
+                                        [trace_type(mode=trace_mode, name=y_col, line=dict(width=2), marker=dict(size=6))
+                                         for y_col in selected_y_axes],
+                                        rows=[i // cols_per_row + 1 for i in range(num_graphs)],
+                                        cols=[i % cols_per_row + 1 for i in range(num_graphs)]
+                                    )
+                                    for i, y_col in enumerate(selected_y_axes):
+                                        fig.update_xaxes(title_text=selected_x_axis, row=i // cols_per_row + 1, col=i % cols_per_row + 1)
+                                        fig.update_yaxes(title_text=y_col, row=i // cols_per_row + 1, col=i % cols_per_row + 1)
+                                    
+                                    # Update layout for the grid of graphs
+                                    fig.update_layout(
+                                        hovermode='x unified',
+                                        showlegend=False,  # Subplot titles name each series
+                                        height=400 * num_rows,
+                                        margin=dict(l=50, r=50, t=50, b=50)
+                                    )
+                                
+                                if is_new_fig or figure_data_keys.get("multi") != plot_key:
+                                    with fig.batch_update():
+                                        for trace, y_col in zip(fig.data, selected_y_axes):
+                                            trace.x, trace.y = downsample(plot_df[selected_x_axis], plot_df[y_col])
+                                    figure_data_keys["multi"] = plot_key
                                 
-                                # Create graphs in rows of up to 2 columns
-                                for i in range(0, num_graphs, cols_per_row):
-                                    # Create columns for this row
-                                    if i + 1 < num_graphs and cols_per_row == 2:
-                                        col_left, col_right = st.columns(2)
-                                        columns = [col_left, col_right]
+                                # Display all graphs in one chart
+                                st.plotly_chart(fig, use_container_width=True, key="json_graph_multi")
+                            else:
+                                # Create single combined plot (original behavior), reused by later
+                                # updates while the selection stays the same
+                                fused = len(selected_y_axes) > FUSED_TRACE_MIN_SERIES
+                                fig, is_new_fig = reuse_figure(st.session_state.json_figures, "combined", (selected_x_axis, tuple(selected_y_axes), trace_mode, trace_type))
+                                if is_new_fig:
+                                    if fused:
+                                        # Many series: one trace with the lines separated by gaps is far cheaper to
+                                        # draw than one trace each; hover text still names the series of each point
+                                        fig.add_trace(trace_type(
+                                            hovertemplate="%{customdata}: %{y}<extra></extra>",
+                                            mode=trace_mode,
+                                            name="All series",
+                                            line=dict(width=2),
+                                            marker=dict(size=6)
+                                        ))
                                     else:
-                                        columns = [st.columns(1)[0]]
+                                        # Add a line for each selected Y-axis, in one call
+                                        fig.add_traces([
+                                            trace_type(mode=trace_mode, name=y_col, line=dict(width=2), marker=dict(size=6))
+                                            for y_col in selected_y_axes
+                                        ])
                                     
-                                    # Create graphs for this row
-                                    for j, col in enumerate(columns):
-                                        graph_index = i + j
-                                        if graph_index < num_graphs:
-                                            y_col = selected_y_axes[graph_index]
-                                            
-                                            with col:
-                                                # Create individual graph
-                                                fig = go.Figure()
-                                                
-                                                fig.add_trace(go.Scatter(
-                                                    x=plot_df[selected_x_axis],
-                                                    y=plot_df[y_col],
-                                                    mode='lines+markers',
-                                                    name=y_col,
-                                                    line=dict(width=2),
-                                                    marker=dict(size=6)
-                                                ))
-                                                
-                                                # Update layout for individual graph
-                                                fig.update_layout(
-                                                    title=f"{y_col} vs {selected_x_axis}",
-                                                    xaxis_title=selected_x_axis,
-                                                    yaxis_title=y_col,
-                                                    hovermode='x unified',
-                                                    showlegend=False,  # Hide legend for individual graphs
-                                                    height=400,
-                                                    margin=dict(l=50, r=50, t=50, b=50)
-                                                )
-                                                
-                                                # Display the individual plot
-                                                st.plotly_chart(fig, use_container_width=True)
-                            else:
-                                # Create single combined plot (original behavior)
-                                fig = go.Figure()
-                                
-                                # Add a line for each selected Y-axis
-                                for y_col in selected_y_axes:
-                                    fig.add_trace(go.Scatter(
-                                        x=plot_df[selected_x_axis],
-                                        y=plot_df[y_col],
-                                        mode='lines+markers',
-                                        name=y_col,
-                                        line=dict(width=2),
-                                        marker=dict(size=6)
-                                    ))
+                                    # Update layout
+                                    fig.update_layout(
+                                        title=f"JSON Data Visualization: {', '.join(selected_y_axes)} vs {selected_x_axis}",
+                                        xaxis_title=selected_x_axis,
+                                        yaxis_title="Values",
+                                        hovermode='x unified',
+                                        showlegend=True,
+                                        height=500
+                                    )
                                 
-                                # Update layout
-                                fig.update_layout(
-                                    title=f"JSON Data Visualization: {', '.join(selected_y_axes)} vs {selected_x_axis}",
-                                    xaxis_title=selected_x_axis,
-                                    yaxis_title="Values",
-                                    hovermode='x unified',
-                                    showlegend=True,
-                                    height=500
-                                )
+                                # Only the trace data changes between updates, and only when there is new data
+                                if is_new_fig or figure_data_keys.get("combined") != plot_key:
+                                    if fused:
+                                        xs, ys, names = [], [], []
+                                        for y_col in selected_y_axes:
+                                            x_values, y_values = downsample(plot_df[selected_x_axis], plot_df[y_col])
+                                            xs += [x_values.to_numpy(dtype=object), [None]]
+                                            ys += [y_values.to_numpy(dtype=float), [np.nan]]
+                                            names += [np.full(len(y_values) + 1, y_col, dtype=object)]
+                                        fig.update_traces(x=np.concatenate(xs), y=np.concatenate(ys), customdata=np.concatenate(names))
+                                    else:
+                                        with fig.batch_update():
+                                            for trace, y_col in zip(fig.data, selected_y_axes):
+                                                trace.x, trace.y = downsample(plot_df[selected_x_axis], plot_df[y_col])
+                                    figure_data_keys["combined"] = plot_key
                                 
                                 # Display the plot
-                                st.plotly_chart(fig, use_container_width=True)
+                                st.plotly_chart(fig, use_container_width=True, key="json_graph_combined")
                             
-                            # Show data summary
-                            st.subheader("Data Summary")
-                            summary_df = plot_df[plot_columns].describe()
-                            st.dataframe(summary_df, use_container_width=True)
+                            # Show data summary, computed only while its expander is open
+                            summary_expander = st.expander("Data Summary", key="data_summary_expander", on_change="rerun")
+                            if summary_expander.open:
+                                with summary_expander:
+                                    summary_df = cached_summary(plot_df, tuple(plot_columns), plot_key, st.session_state.table_cache)
+                                    st.dataframe(summary_df, use_container_width=True)
                             
                             # Add some spacing before the next section
                             st.write("---")
@@ -387,6 +356,210 @@ else:
             elif not selected_y_axes:
                 st.info("Select Y-axis columns and click 'Generate Graph' or enable 'Auto Update Graph' to see the visualization.")
 
+
+# The data-dependent part of the page reruns on its own every REFRESH_SECONDS while
+# the graph auto-updates, instead of sleeping in the script and rerunning the whole page
+auto_refresh_active = (st.session_state.auto_update_graph and 
+                       hasattr(st.session_state, 'is_mqtt_connected') and 
+                       st.session_state.is_mqtt_connected)
+
+@st.fragment(run_every=REFRESH_SECONDS if auto_refresh_active else None)
+def json_messages_view():
+    # --- Auto-refresh data from MQTT client ---
+    # Check if MQTT client exists and is connected, then fetch latest JSON messages
+    if ('mqtt_client' in st.session_state and 
+        st.session_state.mqtt_client and 
+        hasattr(st.session_state, 'is_mqtt_connected') and 
+        st.session_state.is_mqtt_connected):
+        
+        mqtt_client = st.session_state.mqtt_client
+        new_json_df = None
+        
+        if (st.session_state.json_df_live and 
+            'json_messages_df' in st.session_state and 
+            not st.session_state.json_messages_df.empty):
+            # The table already holds the client's messages: append only the new ones
+            new_json_messages = mqtt_client.get_new_json_messages_since(st.session_state.last_json_message_count)
+            if new_json_messages:
+                new_json_df = mqtt_client.json_messages_to_dataframe(new_json_messages)
+                # Keep the table bounded like the client's buffer
+                st.session_state.json_messages_df = append_rows(st.session_state.json_messages_df, new_json_df, mqtt_client.max_messages)
+        else:
+            # Get the latest JSON messages from the MQTT client
+            latest_json_messages = mqtt_client.get_json_messages()
+            table_empty = ('json_messages_df' not in st.session_state or 
+                           st.session_state.json_messages_df.empty)
+            
+            # Build the table from the client's buffer when it is empty or a new message has
+            # arrived. A page loaded from the database is kept until then.
+            if latest_json_messages and (
+                table_empty or 
+                latest_json_messages[-1]["Serial No."] > st.session_state.last_json_message_count):
+                st.session_state.json_messages_df = mqtt_client.json_messages_to_dataframe(latest_json_messages)
+                st.session_state.json_df_live = True
+                # The client keeps a bounded buffer, so new messages are detected by serial
+                # number rather than by list length (which stops growing once it is full)
+                new_count = min(latest_json_messages[-1]["Serial No."] - st.session_state.last_json_message_count, len(latest_json_messages))
+                if new_count > 0:
+                    new_json_df = st.session_state.json_messages_df.iloc[-new_count:]
+        
+        if new_json_df is not None:
+            # Auto-save new messages to database if enabled. They are queued for the database's
+            # background writer, which batches them into transactions, so the page never waits
+            # on disk I/O.
+            if (st.session_state.auto_save_to_db and 
+                st.session_state.use_database):
+                try:
+                    get_json_db().enqueue_messages_df(new_json_df[['Serial No.', 'Timestamp', 'Topic', 'JSON Data', 'RawJSON']])
+                except Exception as e:
+                    st.error(f"Error saving to database: {e}")
+            
+            st.session_state.last_json_message_count = int(new_json_df["Serial No."].iloc[-1])
+        
+        if st.session_state.auto_save_to_db and st.session_state.use_database:
+            # The writer is shared by all sessions and fails in the background: report what it
+            # lost since this session started saving. Lower totals mean a reinitialized database.
+            json_db = get_json_db()
+            totals = (json_db.dropped_count, json_db.failed_count)
+            base = st.session_state.db_write_base
+            if base is None:
+                base = st.session_state.db_write_base = totals
+            elif totals[0] < base[0] or totals[1] < base[1]:
+                base = st.session_state.db_write_base = (0, 0)
+            dropped, failed = totals[0] - base[0], totals[1] - base[1]
+            if dropped:
+                st.warning(f"⚠️ {dropped} messages were not saved to the database (write queue full)")
+            if failed:
+                st.error(f"❌ {failed} messages could not be saved to the database: {json_db.last_write_error}")
+        
+    # Check if we have JSON messages data
+    current_has_data = ('json_messages_df' in st.session_state and 
+                       not st.session_state.json_messages_df.empty)
+
+    # If using database and no current data, try to load from database. Done at most once
+    # per session, so an empty database is not queried again on every refresh.
+    if (st.session_state.use_database and 
+        not current_has_data and
+        not st.session_state.db_autoloaded):
+        st.session_state.db_autoloaded = True
+        try:
+            db_df, st.session_state.db_cursor = load_db_page()
+            if not db_df.empty:
+                st.session_state.json_messages_df = db_df
+                st.session_state.json_df_live = False
+                current_has_data = True
+        except Exception as e:
+            st.error(f"Error loading from database: {e}")
+
+    if not current_has_data:
+        st.info("No JSON messages available. Please connect to the MQTT broker and receive some JSON messages first.")
+        st.markdown("**Note:** JSON messages will appear here when valid JSON payloads are received on the MQTT Client page.")
+        
+        # Show connection status
+        if ('mqtt_client' in st.session_state and 
+            st.session_state.mqtt_client and 
+            hasattr(st.session_state, 'is_mqtt_connected')):
+            if st.session_state.is_mqtt_connected:
+                st.success("MQTT Client is connected. Waiting for JSON messages...")
+            else:
+                st.warning("MQTT Client is not connected. Please connect on the MQTT Client page.")
+        else:
+            st.info("Please visit the MQTT Client page to establish a connection.")
+            
+    else:
+        # Display JSON messages
+        st.subheader("JSON Messages Table")
+        
+        # Show message count and last update info
+        col_info1, col_info2, col_info3 = st.columns(3)
+        with col_info1:
+            current_count = len(st.session_state.json_messages_df)
+            st.metric("Current Messages", current_count)
+        with col_info2:
+            if not st.session_state.json_messages_df.empty:
+                last_message_time = st.session_state.json_messages_df.iloc[-1]['Timestamp']
+                st.metric("Last Message", str(last_message_time))
+        with col_info3:
+            connection_status = "Connected" if (hasattr(st.session_state, 'is_mqtt_connected') and st.session_state.is_mqtt_connected) else "Disconnected"
+            st.metric("MQTT Status", connection_status)
+        
+        # Data source indicator
+        if st.session_state.use_database:
+            try:
+                json_db = get_json_db()
+                db_count = cached_message_count(json_db.db_path, json_db.data_version, json_db)
+                st.info(f"📊 Database contains {db_count} total messages | Showing {len(st.session_state.json_messages_df)} messages")
+            except:
+                st.info("📊 Using database storage")
+        else:
+            st.info("📊 Using session storage only (data will be lost on page refresh)")
+        
+        # Display DataFrame without the raw JSON Data column for cleaner view. With pandas
+        # Copy-on-Write the drop shares the remaining columns' data, so no second copy of the
+        # table has to be kept and appended to.
+        display_df = st.session_state.json_messages_df.drop(columns=HIDDEN_COLUMNS, errors='ignore')
+        # Every append, reconnect or database load replaces the table object, so comparing
+        # identity gives a version that cached views of the table can be keyed on. The
+        # reference kept in table_source stops the old object's id from being reused.
+        if st.session_state.table_source is not st.session_state.json_messages_df:
+            st.session_state.table_source = st.session_state.json_messages_df
+            st.session_state.table_version += 1
+        table_version = st.session_state.table_version
+        table_cache = st.session_state.table_cache
+        # Only the newest rows are sent to the browser; the CSV export below has all of them
+        st.dataframe(arrow_table(display_df.tail(TABLE_MAX_ROWS), table_version, table_cache), height=300, use_container_width=True)
+        if len(display_df) > TABLE_MAX_ROWS:
+            st.caption(f"Showing the newest {TABLE_MAX_ROWS} of {len(display_df)} messages. Export to CSV to see all of them.")
+        
+        # Show expandable raw JSON data
+        with st.expander("View Raw JSON Data"):
+            # Messages are rendered one page at a time, newest first, so the expander
+            # costs O(page size) elements per rerun however large the table is
+            col_raw1, col_raw2 = st.columns(2)
+            with col_raw1:
+                raw_json_count = st.number_input(
+                    "Messages per page",
+                    min_value=1,
+                    value=st.session_state.raw_json_count,
+                    step=10,
+                    key="raw_json_count_input"
+                )
+                st.session_state.raw_json_count = raw_json_count
+            json_messages_df = st.session_state.json_messages_df
+            page_count = max(1, -(-len(json_messages_df) // raw_json_count))
+            with col_raw2:
+                raw_json_page = st.number_input(
+                    f"Page (1 = newest, {page_count} = oldest)",
+                    min_value=1,
+                    max_value=page_count,
+                    value=1,
+                    key="raw_json_page_input"
+                )
+            end = len(json_messages_df) - (raw_json_page - 1) * raw_json_count
+            rows = json_messages_df.iloc[max(0, end - raw_json_count):end]
+            # Plain column values, without boxing each row into a Series or dict
+            for serial, timestamp, topic, json_data in zip(rows['Serial No.'], rows['Timestamp'], rows['Topic'], rows['JSON Data']):
+                st.markdown(f"**Message {serial} ({timestamp}) - Topic: {topic}**")
+                st.json(json_data, expanded=False)
+                st.markdown("---")
+        
+        # --- Export JSON Messages to CSV ---
+        # Encoded only when the button is clicked, not on every refresh. The callable runs on
+        # its own thread, so it uses the cache captured here instead of st.session_state.
+        st.download_button(
+            label="Export JSON Messages to CSV",
+            data=lambda: csv_bytes(display_df, table_version, table_cache),
+            file_name=f"mqtt_json_messages_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+            mime="text/csv",
+            disabled=st.session_state.json_messages_df.empty,
+            key="download_json_csv"
+        )
+        
+        # --- JSON Data Visualization ---
+        graph_panel(display_df, table_version)
+
+json_messages_view()
+
 # Add spacing before refresh controls
 st.write("---")
 
@@ -396,23 +569,11 @@ with col_refresh1:
     if st.button("Refresh Data", help="Refresh to get the latest JSON messages"):
         st.rerun()
 
-# --- Auto-refresh mechanism ---
-# This section implements automatic page refresh when auto-update is enabled
-if (hasattr(st.session_state, 'auto_update_graph') and 
-    st.session_state.auto_update_graph and 
-    hasattr(st.session_state, 'is_mqtt_connected') and 
-    st.session_state.is_mqtt_connected):
-    
-    # Add a placeholder for auto-refresh status
+# --- Auto-refresh status ---
+# The refresh itself is done by the json_messages_view fragment
+if auto_refresh_active:
     with col_refresh2:
-        st.info("🔄 Auto-refresh enabled - Page will update automatically every 2 seconds")
-    
-    # Use st.empty() to create a placeholder for the auto-refresh timer
-    auto_refresh_placeholder = st.empty()
-    
-    # Implement auto-refresh with a short delay
-    time.sleep(2)  # Wait 2 seconds before triggering refresh
-    st.rerun()  # Trigger page refresh to get latest data
+        st.info(f"🔄 Auto-refresh enabled - Page will update automatically every {REFRESH_SECONDS} seconds")
 
 elif (hasattr(st.session_state, 'auto_update_graph') and 
       st.session_state.auto_update_graph and 
@@ -430,24 +591,33 @@ st.subheader("Database Actions")
 col_btn1, col_btn2, col_btn3, col_btn4 = st.columns(4)
 
 with col_btn1:
-    if st.button("Load from DB", type="primary", disabled=not use_db, help="Load all messages from database"):
+    if st.button("Load from DB", type="primary", disabled=not use_db, help=f"Load the newest {DB_PAGE_SIZE} messages from database; Load Older fetches earlier ones"):
         try:
-            db_messages = st.session_state.json_db.get_all_messages()
-            if db_messages:
-                st.session_state.json_messages_df = pd.DataFrame(db_messages)
-                st.success(f"Loaded {len(db_messages)} messages from database")
+            db_df, st.session_state.db_cursor = load_db_page()
+            if not db_df.empty:
+                st.session_state.json_messages_df = db_df
+                st.session_state.json_df_live = False
+                st.success(f"Loaded {len(db_df)} messages from database")
                 st.rerun()
             else:
                 st.info("No messages found in database")
         except Exception as e:
             st.error(f"Error loading from database: {e}")
+    if st.button("Load Older", disabled=not use_db or st.session_state.db_cursor is None, help="Load the next page of older messages from database"):
+        try:
+            db_df, st.session_state.db_cursor = load_db_page(before=st.session_state.db_cursor)
+            if not db_df.empty:
+                st.session_state.json_messages_df = pd.concat([st.session_state.json_messages_df, db_df], ignore_index=True)
+                st.session_state.json_df_live = False
+            st.rerun()
+        except Exception as e:
+            st.error(f"Error loading from database: {e}")
 
 with col_btn2:
     if st.button("Save to DB", type="primary", disabled=not use_db, help="Save current messages to database"):
         if 'json_messages_df' in st.session_state and not st.session_state.json_messages_df.empty:
             try:
-                messages_to_save = st.session_state.json_messages_df.to_dict('records')
-                st.session_state.json_db.insert_messages_batch(messages_to_save)
+                get_json_db().insert_messages_df(st.session_state.json_messages_df)
                 st.success("Messages saved to database")
             except Exception as e:
                 st.error(f"Error saving to database: {e}")
@@ -462,15 +632,15 @@ with col_btn3:
         # Also clear the MQTT client's JSON messages if it exists
         if ('mqtt_client' in st.session_state and 
             st.session_state.mqtt_client and 
-            hasattr(st.session_state.mqtt_client, 'json_messages')):
-            st.session_state.mqtt_client.json_messages = []
+            hasattr(st.session_state.mqtt_client, 'clear_json_messages')):
+            st.session_state.mqtt_client.clear_json_messages()
         st.success("Table cleared")
         st.rerun()
 
 with col_btn4:
     if st.button("Clear DB", type="secondary", disabled=not use_db, help="Clear all messages from database"):
         try:
-            st.session_state.json_db.clear_all_messages()
+            get_json_db().clear_all_messages()
             st.success("Database cleared")
         except Exception as e:
             st.error(f"Error clearing database: {e}")
@@ -478,11 +648,30 @@ with col_btn4:
 
 
 
+# Export from database option. Outside the auto-refreshing fragment, so the whole
+# database is only read on full page runs.
+if st.session_state.use_database:
+    try:
+        json_db = get_json_db()
+        data_version = json_db.data_version
+        if cached_message_count(json_db.db_path, data_version, json_db):
+            # The database is only read and encoded when the button is clicked
+            st.download_button(
+                label="Export All DB Messages to CSV",
+                data=lambda: cached_db_csv(json_db.db_path, data_version, json_db) or b"",
+                file_name=f"mqtt_all_db_messages_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+                mime="text/csv",
+                key="download_db_csv"
+            )
+    except Exception as e:
+        st.error(f"Error preparing database export: {e}")
+
 # Additional database info and danger zone
 if use_db:
     with st.expander("📊 Database Information"):
         try:
-            topics_in_db = st.session_state.json_db.get_topics()
+            json_db = get_json_db()
+            topics_in_db = cached_topics(json_db.db_path, json_db.data_version, json_db)
             if topics_in_db:
                 st.write("**Topics in Database:**")
                 for topic in topics_in_db[:10]:  # Show first 10 topics
@@ -493,17 +682,31 @@ if use_db:
                 st.info("No topics found in database")
         except Exception as e:
             st.error(f"Database error: {e}")
+        
+        if st.button("Remove Duplicates", help="Delete repeated copies of the same message, e.g. saved by older versions"):
+            try:
+                removed = get_json_db().remove_duplicate_messages()
+                st.success(f"Removed {removed} duplicate messages")
+            except Exception as e:
+                st.error(f"Error removing duplicates: {e}")
     
     with st.expander("⚠️ Danger Zone"):
         st.warning("This action will permanently delete the database file!")
         if st.button("Delete Database File", type="secondary", help="Permanently delete the database file"):
             try:
-                if st.session_state.json_db.delete_database():
-                    st.success("Database file deleted")
-                    # Reinitialize database
-                    st.session_state.json_db = JSONMessageDB()
-                else:
-                    st.error("Failed to delete database file")
+                deleted = get_json_db().delete_database()
             except Exception as e:
+                deleted = None
                 st.error(f"Error deleting database: {e}")
+            # The old instance is closed either way: reinitialize the database for every
+            # session. The new instance restarts data_version, so cached lookups of the
+            # deleted file are dropped too.
+            get_json_db.clear()
+            cached_message_count.clear()
+            cached_topics.clear()
+            cached_db_csv.clear()
+            if deleted:
+                st.success("Database file deleted")
+            elif deleted is not None:
+                st.error("Failed to delete database file")
             st.rerun()